@@ -0,0 +1,263 @@
+
+"""  图片压缩基准测试脚本  """
+
+import os
+import io
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import platform
+import subprocess
+import contextlib
+import importlib.util
+from pathlib import Path
+
+import PIL
+from PIL import Image, ImageDraw
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，无法统计峰值内存
+    resource = None
+
+
+def _load_compressor_module():
+    """加载同目录下的 image-compress.py（文件名含连字符，不能直接 import）"""
+    spec = importlib.util.spec_from_file_location(
+        'image_compress', Path(__file__).with_name('image-compress.py'))
+    module = importlib.util.module_from_spec(spec)
+    # 注册到 sys.modules，工作进程才能按名称找到 _init_worker 等函数
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+image_compress = _load_compressor_module()
+
+# 合成图片的尺寸，小图比例更高，接近真实素材分布
+CORPUS_SIZES = [(320, 240), (320, 240), (800, 600), (800, 600), (1280, 720), (1920, 1080), (4000, 3000)]
+
+# 合成图片的类型：(名称, 扩展名)
+CORPUS_KINDS = [
+    ('jpeg', '.jpg'),
+    ('png', '.png'),
+    ('png-palette', '.png'),
+    ('webp', '.webp'),
+    ('bmp', '.bmp'),
+]
+
+# 基准测试模式：传给 ImageCompressor 的参数，prime 表示先运行一次再测量（用于增量模式）
+BENCH_MODES = {
+    'serial-fixed': {'strategy': 'fixed'},
+    'serial-auto': {'strategy': 'auto'},
+    'parallel-auto': {'strategy': 'auto', 'workers': 0},
+    'resize': {'strategy': 'auto', 'max_dimension': 1024, 'workers': 0},
+    'incremental-rerun': {'strategy': 'auto', 'incremental': True, 'workers': 0, 'prime': True},
+}
+
+
+def _synthetic_image(rng, size, kind):
+    """根据随机数生成器生成一张确定性的合成图片"""
+    width, height = size
+
+    # 渐变背景 + 分形纹理，模拟照片中的平滑区域和细节
+    gradient = Image.linear_gradient('L').rotate(rng.choice([0, 90, 180, 270])).resize(size)
+    radial = Image.radial_gradient('L').resize(size)
+    x0 = rng.uniform(-2.0, -0.5)
+    y0 = rng.uniform(-1.5, 0.0)
+    extent = rng.uniform(0.5, 1.5)
+    texture = Image.effect_mandelbrot(size, (x0, y0, x0 + extent, y0 + extent), rng.randint(20, 80))
+    img = Image.merge('RGB', (gradient, radial, texture))
+
+    # 随机色块，模拟截图、图表中的纯色区域
+    draw = ImageDraw.Draw(img)
+    for _ in range(rng.randint(5, 30)):
+        xs = sorted(rng.randrange(width) for _ in range(2))
+        ys = sorted(rng.randrange(height) for _ in range(2))
+        color = tuple(rng.randrange(256) for _ in range(3))
+        if rng.random() < 0.5:
+            draw.rectangle((xs[0], ys[0], xs[1], ys[1]), fill=color)
+        else:
+            draw.ellipse((xs[0], ys[0], xs[1], ys[1]), fill=color)
+
+    if kind == 'png-palette':
+        img = img.quantize(colors=rng.choice([16, 64, 256]))
+    return img
+
+
+def generate_corpus(corpus_dir, count=200, seed=42):
+    """
+    生成确定性的合成图片语料（JPEG / PNG / 调色板+透明 PNG / WebP / BMP，多种尺寸）
+
+    相同的 count 和 seed 总是生成相同的图片
+    """
+    corpus_dir = Path(corpus_dir)
+    rng = random.Random(seed)
+    for index in range(count):
+        kind, ext = CORPUS_KINDS[index % len(CORPUS_KINDS)]
+        size = rng.choice(CORPUS_SIZES)
+        img = _synthetic_image(rng, size, kind)
+
+        # 分散到多级子目录中，覆盖目录遍历逻辑
+        path = corpus_dir / f"set_{index % 8}" / kind / f"img_{index:05d}{ext}"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if kind == 'jpeg':
+            img.save(path, quality=95)
+        elif kind == 'webp':
+            img.save(path, quality=95)
+        elif kind == 'png-palette':
+            img.save(path, transparency=0)
+        elif kind == 'png':
+            img.save(path, compress_level=1)
+        else:
+            img.save(path)
+
+    print(f"已生成 {count} 张合成图片: {corpus_dir}", file=sys.stderr)
+
+
+def _corpus_stats(corpus_dir):
+    """统计语料中的图片数量和总字节数"""
+    files = 0
+    total_bytes = 0
+    for root, _, names in os.walk(corpus_dir):
+        for name in names:
+            if name.lower().endswith(image_compress.SUPPORTED_EXTENSIONS):
+                files += 1
+                total_bytes += os.path.getsize(os.path.join(root, name))
+    return files, total_bytes
+
+
+def _peak_rss_mb(who):
+    """返回峰值常驻内存（MB），不支持时返回 None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _single_run(spec):
+    """在当前进程中运行一次压缩并返回测量结果（由子进程调用，保证内存统计互不干扰）"""
+    options = dict(spec['options'])
+    compressor = image_compress.ImageCompressor(spec['corpus'], spec['output'], **options)
+
+    # 压缩器的进度输出与基准结果无关，丢弃
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        compressor.run()
+    elapsed = time.perf_counter() - start
+
+    stats = compressor.stats
+    _, input_bytes = _corpus_stats(spec['corpus'])
+    return {
+        'seconds': round(elapsed, 4),
+        'images': compressor.discovered,
+        'processed': stats['processed'],
+        'unchanged': stats['unchanged'],
+        'errors': len(stats['errors']),
+        'images_per_sec': round(compressor.discovered / elapsed, 2) if elapsed else None,
+        'mb_per_sec': round(input_bytes / 1024 / 1024 / elapsed, 2) if elapsed else None,
+        'peak_rss_mb': _peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+        'peak_worker_rss_mb': _peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+        # 多进程模式下为各工作进程耗时之和
+        'phase_seconds': {phase: round(seconds, 4) for phase, seconds in stats['timings'].items()},
+        'compression_ratio': (round(stats['compressed_size'] / stats['original_size'], 4)
+                              if stats['original_size'] else None),
+        'strategies': stats['strategies'],
+    }
+
+
+def _run_in_subprocess(spec):
+    """在独立子进程中运行一次测量，返回解析后的 JSON 结果"""
+    completed = subprocess.run(
+        [sys.executable, __file__, '--single-run', json.dumps(spec)],
+        capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout)
+
+
+def run_benchmark(corpus_dir, modes, workers):
+    """依次运行各个模式，返回完整的基准测试报告"""
+    files, total_bytes = _corpus_stats(corpus_dir)
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'pillow': PIL.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'corpus': {'path': str(corpus_dir), 'images': files, 'bytes': total_bytes},
+        'runs': [],
+    }
+
+    with tempfile.TemporaryDirectory(prefix='image-compress-bench-') as work_dir:
+        for mode in modes:
+            options = dict(BENCH_MODES[mode])
+            prime = options.pop('prime', False)
+            if options.get('workers') == 0:
+                options['workers'] = workers
+
+            spec = {
+                'corpus': str(corpus_dir),
+                'output': os.path.join(work_dir, mode),
+                'options': options,
+            }
+            print(f"运行模式: {mode}", file=sys.stderr)
+            if prime:
+                _run_in_subprocess(spec)
+            result = _run_in_subprocess(spec)
+            report['runs'].append({'mode': mode, 'options': options, **result})
+            shutil.rmtree(spec['output'], ignore_errors=True)
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="图片压缩基准测试")
+    parser.add_argument("--corpus", help="语料目录（不存在时自动生成；默认使用临时目录）")
+    parser.add_argument("--count", type=int, default=200, help="生成的合成图片数量（默认 200）")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子（默认 42）")
+    parser.add_argument("--modes", default=','.join(BENCH_MODES),
+                        help=f"逗号分隔的测试模式，可选: {', '.join(BENCH_MODES)}")
+    parser.add_argument("--workers", "-w", type=int, default=os.cpu_count() or 1,
+                        help="并行模式使用的进程数（默认 CPU 核数）")
+    parser.add_argument("--output", "-o", help="JSON 报告输出文件（默认输出到标准输出）")
+    parser.add_argument("--single-run", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single_run:
+        print(json.dumps(_single_run(json.loads(args.single_run))))
+        return 0
+
+    modes = [mode.strip() for mode in args.modes.split(',') if mode.strip()]
+    unknown = [mode for mode in modes if mode not in BENCH_MODES]
+    if unknown:
+        parser.error(f"未知的测试模式: {', '.join(unknown)}")
+
+    with contextlib.ExitStack() as stack:
+        if args.corpus:
+            corpus_dir = Path(args.corpus)
+            if not corpus_dir.exists():
+                generate_corpus(corpus_dir, args.count, args.seed)
+        else:
+            corpus_dir = Path(stack.enter_context(tempfile.TemporaryDirectory(prefix='image-corpus-')))
+            generate_corpus(corpus_dir, args.count, args.seed)
+
+        report = run_benchmark(corpus_dir, modes, args.workers)
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(output, encoding='utf-8')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+#  pip install pillow
+#  eg: python .\image-compress-benchmark.py --count 500 --output bench.json
+#  eg: python .\image-compress-benchmark.py --corpus E:\bench_corpus --modes serial-fixed,parallel-auto
@@ -2,29 +2,221 @@
 """  图片压缩脚本  """
 
 import os
-from PIL import Image
+import io
+import shutil
+from PIL import Image, ImageChops, ImageStat
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import argparse
+import hashlib
+import math
+import queue
+import sqlite3
+import threading
 import sys
 import time
 
 SUPPORTED_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp')
 
+# 扩展名对应的 Pillow 保存格式（输出保持原扩展名）
+SAVE_FORMATS = {
+    '.jpg': 'JPEG',
+    '.jpeg': 'JPEG',
+    '.png': 'PNG',
+    '.webp': 'WEBP',
+    '.bmp': 'BMP',
+}
+
+# 单张图片处理的各阶段，用于统计耗时
+PHASES = ('decode', 'convert', 'resize', 'encode', 'write')
+
+# 增量模式下保存在输出目录中的清单文件
+MANIFEST_NAME = '.compress-manifest.sqlite'
+
+# 文件发现队列的容量，发现阶段领先处理阶段最多这么多个文件
+DISCOVERY_QUEUE_SIZE = 10000
+
+# 发现线程结束时放入队列的标记
+_DISCOVERY_DONE = object()
+
+# 每个工作进程允许排队的任务数，用于限制在途任务数量，保持内存平稳
+IN_FLIGHT_PER_WORKER = 4
+
+# 工作进程内的压缩器实例（由 _init_worker 创建）
+_worker_compressor = None
+
+
+def _init_worker(options):
+    """进程池初始化：在每个工作进程中创建一次压缩器"""
+    global _worker_compressor
+    _worker_compressor = ImageCompressor(**options)
+
+
+def _process_in_worker(input_path):
+    """在工作进程中处理单个图片，返回 ((结果, 文件指纹), 本次产生的错误)"""
+    _worker_compressor.stats['errors'] = []
+    task_result = _worker_compressor._compress_task(input_path)
+    return task_result, _worker_compressor.stats['errors']
+
+
+def _file_digest(file_path, chunk_size=1024 * 1024):
+    """计算文件内容哈希"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _psnr(reference, candidate):
+    """计算两张同尺寸图片的峰值信噪比（dB），完全相同时返回 inf"""
+    diff = ImageChops.difference(reference, candidate.convert(reference.mode))
+    sum2 = sum(ImageStat.Stat(diff).sum2)
+    mse = sum2 / (reference.width * reference.height * len(reference.getbands()))
+    if mse == 0:
+        return float('inf')
+    return 10 * math.log10(255 ** 2 / mse)
+
+
+def _ssim(reference, candidate, block=8):
+    """在灰度图上按 8x8 分块计算平均结构相似度（SSIM）"""
+    import numpy as np
+
+    a = np.asarray(reference.convert('L'), dtype=np.float64)
+    b = np.asarray(candidate.convert('L'), dtype=np.float64)
+    h = (a.shape[0] // block) * block or a.shape[0]
+    w = (a.shape[1] // block) * block or a.shape[1]
+    by, bx = (block, block) if h >= block and w >= block else (h, w)
+    a = a[:h, :w].reshape(h // by, by, w // bx, bx)
+    b = b[:h, :w].reshape(h // by, by, w // bx, bx)
+
+    mu_a = a.mean(axis=(1, 3))
+    mu_b = b.mean(axis=(1, 3))
+    var_a = a.var(axis=(1, 3))
+    var_b = b.var(axis=(1, 3))
+    cov = (a * b).mean(axis=(1, 3)) - mu_a * mu_b
+
+    c1 = (0.01 * 255) ** 2
+    c2 = (0.03 * 255) ** 2
+    ssim = ((2 * mu_a * mu_b + c1) * (2 * cov + c2)) / ((mu_a ** 2 + mu_b ** 2 + c1) * (var_a + var_b + c2))
+    return float(ssim.mean())
+
+
+def _lap(timings, phase, since):
+    """把 since 至今的耗时累加到对应阶段，返回当前时间"""
+    now = time.perf_counter()
+    timings[phase] += now - since
+    return now
+
+
+def _fit_size(size, max_dimension=None, target_width=None):
+    """按目标宽度 / 最大边长计算缩放后的尺寸（只缩小不放大）"""
+    width, height = size
+    if target_width and target_width < width:
+        height = max(1, round(height * target_width / width))
+        width = target_width
+    if max_dimension and max(width, height) > max_dimension:
+        scale = max_dimension / max(width, height)
+        width = max(1, round(width * scale))
+        height = max(1, round(height * scale))
+    return width, height
+
+
+def _resize(img, size):
+    """缩放图片，先用 reduce 做整数倍快速缩小再做高质量重采样"""
+    if img.size == size:
+        return img
+    return img.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+
+def _quantize(img):
+    """PNG 调色板量化（保留透明通道）"""
+    return img.quantize(colors=256, method=Image.Quantize.FASTOCTREE)
+
+
+class CompressManifest:
+    """
+    增量压缩清单
+
+    以相对路径为主键，记录输入文件的大小、修改时间、内容哈希以及压缩参数，
+    重复运行时据此跳过未变化的图片
+    """
+
+    # 每累计多少条更新提交一次事务
+    COMMIT_INTERVAL = 1000
+
+    def __init__(self, db_path, settings):
+        self.settings = settings
+        self.conn = sqlite3.connect(str(db_path))
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS files ('
+            'path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, digest TEXT, settings TEXT)'
+        )
+        self._pending_updates = 0
+
+    def lookup(self, rel_path):
+        """返回 (size, mtime_ns, digest, settings)，不存在时返回 None"""
+        return self.conn.execute(
+            'SELECT size, mtime_ns, digest, settings FROM files WHERE path = ?', (rel_path,)
+        ).fetchone()
+
+    def update(self, rel_path, size, mtime_ns, digest):
+        """写入或更新一条记录"""
+        self.conn.execute(
+            'INSERT OR REPLACE INTO files (path, size, mtime_ns, digest, settings) VALUES (?, ?, ?, ?, ?)',
+            (rel_path, size, mtime_ns, digest, self.settings)
+        )
+        self._pending_updates += 1
+        if self._pending_updates >= self.COMMIT_INTERVAL:
+            self.conn.commit()
+            self._pending_updates = 0
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
 
 class ImageCompressor:
-    def __init__(self, input_dir, output_dir, quality=85, optimize=True):
+    def __init__(self, input_dir, output_dir, quality=85, optimize=True, workers=1, incremental=False,
+                 strategy='auto', min_psnr=30.0, min_ssim=None, trial_budget=5.0,
+                 max_dimension=None, target_width=None, thumbnail_sizes=()):
         self.input_dir = Path(input_dir).resolve()
         self.output_dir = Path(output_dir).resolve()
         self.quality = quality
         self.optimize = optimize
+        # 编码策略：auto 试验多个候选编码取最小，fixed 使用单一固定参数
+        self.strategy = strategy
+        # 有损候选需要满足的质量阈值（None 表示不检查）
+        self.min_psnr = min_psnr
+        self.min_ssim = min_ssim
+        # 单张图片试验候选编码的时间预算（秒），超出后不再尝试后续候选
+        self.trial_budget = trial_budget
+        # 输出尺寸限制；JPEG 使用 draft 模式按目标尺寸解码
+        self.max_dimension = max_dimension
+        self.target_width = target_width
+        # 额外生成的缩略图（最长边像素），与主输出共用一次解码
+        self.thumbnail_sizes = sorted(set(thumbnail_sizes), reverse=True)
+        self.workers = max(1, workers)
+        self.incremental = incremental
+        self.manifest = None
         self.stats = {
             'processed': 0,
             'skipped': 0,
+            'unchanged': 0,
+            'strategies': {},
+            'thumbnails': 0,
+            'timings': dict.fromkeys(PHASES, 0.0),
             'original_size': 0,
             'compressed_size': 0,
             'errors': []
         }
         self.start_time = time.time()
 
+        # 流式处理的进度：已发现 / 已完成文件数
+        self.discovered = 0
+        self.completed = 0
+        self.discovery_done = False
+
         # 创建输出根目录
         self.output_dir.mkdir(parents=True, exist_ok=True)
 
@@ -39,13 +231,151 @@ class ImageCompressor:
         # 生成输出路径
         return self.output_dir / relative_path
 
+    def _manifest_key(self, input_path):
+        """清单中使用的相对路径"""
+        return input_path.relative_to(self.input_dir).as_posix()
+
+    def _settings_key(self):
+        """影响输出结果的压缩参数，参数变化时需要重新压缩"""
+        return (f"quality={self.quality};optimize={self.optimize};strategy={self.strategy};"
+                f"min_psnr={self.min_psnr};min_ssim={self.min_ssim};"
+                f"max_dimension={self.max_dimension};target_width={self.target_width};"
+                f"thumbnails={','.join(map(str, self.thumbnail_sizes))}")
+
+    def _is_unchanged(self, input_path):
+        """根据清单判断图片自上次压缩后是否未变化"""
+        row = self.manifest.lookup(self._manifest_key(input_path))
+        if row is None:
+            return False
+
+        size, mtime_ns, digest, settings = row
+        if settings != self.manifest.settings or not self._get_output_path(input_path).exists():
+            return False
+
+        st = input_path.stat()
+        if st.st_size != size:
+            return False
+        if st.st_mtime_ns == mtime_ns:
+            return True
+
+        # 大小相同但修改时间变化（如被 touch 或重新拷贝），再比较内容哈希
+        if _file_digest(input_path) == digest:
+            self.manifest.update(self._manifest_key(input_path), st.st_size, st.st_mtime_ns, digest)
+            return True
+        return False
+
+    def _candidates(self, save_format):
+        """
+        返回候选编码列表，按从快到慢排列
+
+        每项为 (名称, 保存参数, 是否有损, 预处理函数)
+        """
+        if self.strategy == 'fixed':
+            save_args = {'quality': self.quality, 'optimize': self.optimize}
+            if save_format in ('PNG', 'BMP'):
+                save_args['compress_level'] = 9
+            return [('fixed', save_args, False, None)]
+
+        if save_format == 'JPEG':
+            return [
+                ('jpeg', {'quality': self.quality, 'optimize': self.optimize}, True, None),
+                ('jpeg-progressive', {'quality': self.quality, 'optimize': self.optimize,
+                                      'progressive': True}, True, None),
+            ]
+        if save_format == 'WEBP':
+            return [
+                ('webp-lossy', {'quality': self.quality, 'method': 4}, True, None),
+                ('webp-lossless', {'lossless': True, 'quality': 50, 'method': 4}, False, None),
+            ]
+        if save_format == 'PNG':
+            return [
+                ('png-fast', {'compress_level': 6}, False, None),
+                ('png-quantized', {'compress_level': 6}, True, _quantize),
+                ('png-max', {'optimize': self.optimize, 'compress_level': 9}, False, None),
+            ]
+        return [(save_format.lower(), {}, False, None)]
+
+    def _meets_quality(self, reference, data):
+        """检查有损候选编码的 PSNR / SSIM 是否达到阈值"""
+        if self.min_psnr is None and self.min_ssim is None:
+            return True
+        with Image.open(io.BytesIO(data)) as candidate:
+            candidate = candidate.convert(reference.mode)
+            if self.min_psnr is not None and _psnr(reference, candidate) < self.min_psnr:
+                return False
+            if self.min_ssim is not None and _ssim(reference, candidate) < self.min_ssim:
+                return False
+        return True
+
+    def _select_encoding(self, img, save_format, size_limit=None):
+        """
+        试验候选编码，返回满足质量阈值且小于 size_limit 的最小结果
+
+        :param size_limit: 结果必须小于该字节数（None 表示不限制）
+        :return: (策略名称, 编码数据)；有大小限制且没有候选满足时返回 (None, None)，
+                 无大小限制且没有候选达到质量阈值时返回最小的候选
+        """
+        if save_format == 'JPEG' and img.mode != 'RGB':
+            img = img.convert('RGB')
+
+        best_name, best_data = None, None
+        smallest_name, smallest_data = None, None
+        start = time.perf_counter()
+        for index, (name, save_args, lossy, transform) in enumerate(self._candidates(save_format)):
+            if index and time.perf_counter() - start > self.trial_budget:
+                break
+
+            buffer = io.BytesIO()
+            (transform(img) if transform else img).save(buffer, format=save_format, **save_args)
+            data = buffer.getvalue()
+
+            if smallest_data is None or len(data) < len(smallest_data):
+                smallest_name, smallest_data = name, data
+
+            # 不比原图和当前最优结果更小的候选直接丢弃
+            if size_limit is not None and len(data) >= size_limit:
+                continue
+            if best_data is not None and len(data) >= len(best_data):
+                continue
+            if lossy and not self._meets_quality(img, data):
+                continue
+            best_name, best_data = name, data
+
+        if best_data is None and size_limit is None:
+            return smallest_name, smallest_data
+        return best_name, best_data
+
+    def _thumbnail_path(self, output_path, size):
+        """缩略图输出路径：<文件名>_<尺寸><扩展名>"""
+        return output_path.with_name(f"{output_path.stem}_{size}{output_path.suffix}")
+
     def _process_image(self, input_path):
-        """处理单个图片文件"""
+        """
+        处理单个图片文件
+
+        :return: (原始大小, 压缩后大小, 使用的策略, 缩略图数量, 各阶段耗时)，失败时返回 None
+        """
         try:
             output_path = self._get_output_path(input_path)
             output_path.parent.mkdir(parents=True, exist_ok=True)
+            original_size = input_path.stat().st_size
+            timings = dict.fromkeys(PHASES, 0.0)
+            clock = time.perf_counter()
 
             with Image.open(input_path) as img:
+                target_size = _fit_size(img.size, self.max_dimension, self.target_width)
+                resized = target_size != img.size
+
+                # JPEG 按所需的最大尺寸以 1/2、1/4、1/8 缩放解码，省去全分辨率解码
+                decode_size = target_size
+                if self.thumbnail_sizes:
+                    thumb_size = _fit_size(img.size, self.thumbnail_sizes[0])
+                    decode_size = (max(decode_size[0], thumb_size[0]), max(decode_size[1], thumb_size[1]))
+                if decode_size != img.size:
+                    img.draft(img.mode, decode_size)
+                img.load()
+                clock = _lap(timings, 'decode', clock)
+
                 """
                 # 保留原始模式（如RGBA、LA等）
                 if img.mode in ('RGBA', 'LA'):
@@ -60,75 +390,240 @@ class ImageCompressor:
                     img = img.convert('RGBA')
                 else:
                     img = img.convert('RGB')
+                clock = _lap(timings, 'convert', clock)
 
-                save_args = {
-                    'quality': self.quality,
-                    'optimize': self.optimize
-                }
+                save_format = SAVE_FORMATS[input_path.suffix.lower()]
 
-                # 根据文件类型调整保存参数
-                if input_path.suffix.lower() in ('.png', '.bmp'):
-                    img.save(output_path, **save_args, compress_level=9)
-                else:
-                    img.save(output_path, **save_args)
+                # 缩略图由大到小依次从上一级结果缩放，只解码一次
+                thumbnails = 0
+                source = img
+                for size in self.thumbnail_sizes:
+                    source = _resize(source, _fit_size(source.size, size))
+                    clock = _lap(timings, 'resize', clock)
+                    _, thumb_data = self._select_encoding(source, save_format)
+                    clock = _lap(timings, 'encode', clock)
+                    self._thumbnail_path(output_path, size).write_bytes(thumb_data)
+                    clock = _lap(timings, 'write', clock)
+                    thumbnails += 1
+
+                if resized:
+                    img = _resize(img, target_size)
+                    clock = _lap(timings, 'resize', clock)
+                # 缩放后的输出不和原图比较大小
+                strategy, data = self._select_encoding(img, save_format, None if resized else original_size)
+                clock = _lap(timings, 'encode', clock)
 
-                original_size = input_path.stat().st_size
-                compressed_size = output_path.stat().st_size
-                return (original_size, compressed_size)
+            # 没有任何候选比原图小时，直接复制原图，保证输出不会变大
+            if data is None:
+                shutil.copyfile(input_path, output_path)
+                _lap(timings, 'write', clock)
+                return (original_size, original_size, 'copy', thumbnails, timings)
+
+            output_path.write_bytes(data)
+            _lap(timings, 'write', clock)
+            return (original_size, len(data), strategy, thumbnails, timings)
 
         except Exception as e:
             self.stats['errors'].append(f"{input_path}: {str(e)}")
             return None
 
-    def _print_progress(self, current, total):
-        """打印处理进度"""
-        progress = current / total
+    def _print_progress(self):
+        """打印处理进度（已完成 / 已发现），发现阶段未结束时总数后带 +"""
+        progress = self.completed / self.discovered if self.discovered else 0
         bar_length = 40
         filled = int(bar_length * progress)
         bar = '#' * filled + '-' * (bar_length - filled)
-        sys.stdout.write(f"\rProcessing: [{bar}] {progress:.1%}")
+        more = '' if self.discovery_done else '+'
+        sys.stdout.write(f"\rProcessing: [{bar}] {self.completed}/{self.discovered}{more}")
         sys.stdout.flush()
 
-    def run(self):
-        """执行压缩操作"""
-        # 获取所有需要处理的文件
-        all_files = []
-        for root, _, files in os.walk(self.input_dir):
-            for file in files:
-                path = Path(root) / file
-                if self._should_process(path):
-                    all_files.append(path)
-
-        total_files = len(all_files)
-        print(f"Found {total_files} image files to process")
-        print(f"输出目录: {self.output_dir}")
+    def _iter_images(self):
+        """使用 os.scandir 遍历输入目录，边遍历边产出图片路径"""
+        stack = [str(self.input_dir)]
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file():
+                            path = Path(entry.path)
+                            if self._should_process(path):
+                                yield path
+            except OSError as e:
+                self.stats['errors'].append(f"{current}: {str(e)}")
+
+    def _discover(self, file_queue):
+        """发现线程：把图片路径放入有界队列，队列满时阻塞"""
+        try:
+            for path in self._iter_images():
+                file_queue.put(path)
+                self.discovered += 1
+        finally:
+            self.discovery_done = True
+            file_queue.put(_DISCOVERY_DONE)
+
+    def _drain(self, file_queue):
+        """从发现队列中逐个取出文件，增量模式下跳过未变化的图片"""
+        while True:
+            file_path = file_queue.get()
+            if file_path is _DISCOVERY_DONE:
+                return
+
+            if self.manifest:
+                try:
+                    unchanged = self._is_unchanged(file_path)
+                except OSError:
+                    unchanged = False
+                if unchanged:
+                    self.stats['unchanged'] += 1
+                    self.completed += 1
+                    self._print_progress()
+                    continue
+
+            yield file_path
+
+    def _worker_options(self):
+        """传给工作进程的构造参数"""
+        return {
+            'input_dir': self.input_dir,
+            'output_dir': self.output_dir,
+            'quality': self.quality,
+            'optimize': self.optimize,
+            'incremental': self.incremental,
+            'strategy': self.strategy,
+            'min_psnr': self.min_psnr,
+            'min_ssim': self.min_ssim,
+            'trial_budget': self.trial_budget,
+            'max_dimension': self.max_dimension,
+            'target_width': self.target_width,
+            'thumbnail_sizes': self.thumbnail_sizes,
+        }
 
-        for i, file_path in enumerate(all_files, 1):
-            self._print_progress(i, total_files)
+    def _compress_task(self, input_path):
+        """
+        压缩单个图片，增量模式下同时计算输入文件指纹
 
+        :return: (压缩结果, (size, mtime_ns, digest) 或 None)
+        """
+        fingerprint = None
+        if self.incremental:
+            st = input_path.stat()
+        result = self._process_image(input_path)
+        if result and self.incremental:
+            fingerprint = (st.st_size, st.st_mtime_ns, _file_digest(input_path))
+        return result, fingerprint
+
+    def _record_result(self, file_path, result, fingerprint=None):
+        """把单个文件的处理结果合并到统计信息，并更新清单"""
+        if result:
+            self.stats['processed'] += 1
+            self.stats['original_size'] += result[0]
+            self.stats['compressed_size'] += result[1]
+            strategies = self.stats['strategies']
+            strategies[result[2]] = strategies.get(result[2], 0) + 1
+            self.stats['thumbnails'] += result[3]
+            for phase, seconds in result[4].items():
+                self.stats['timings'][phase] += seconds
+            if self.manifest and fingerprint:
+                self.manifest.update(self._manifest_key(file_path), *fingerprint)
+        else:
+            self.stats['skipped'] += 1
+
+    def _run_serial(self, files):
+        """单进程逐个处理"""
+        for file_path in files:
             try:
-                # 记录原始文件大小
-                original_size = file_path.stat().st_size
-                result = self._process_image(file_path)
-
-                if result:
-                    self.stats['processed'] += 1
-                    self.stats['original_size'] += result[0]
-                    self.stats['compressed_size'] += result[1]
-                else:
-                    self.stats['skipped'] += 1
+                self._record_result(file_path, *self._compress_task(file_path))
             except Exception as e:
                 self.stats['errors'].append(f"{file_path}: {str(e)}")
                 self.stats['skipped'] += 1
 
+            self.completed += 1
+            self._print_progress()
+
+    def _collect(self, future, file_path):
+        """收集工作进程的结果，合并其统计与错误"""
+        try:
+            (result, fingerprint), errors = future.result()
+        except Exception as e:
+            self.stats['errors'].append(f"{file_path}: {str(e)}")
+            self.stats['skipped'] += 1
+            return
+        self.stats['errors'].extend(errors)
+        self._record_result(file_path, result, fingerprint)
+
+    def _run_parallel(self, files):
+        """
+        使用进程池并行处理
+
+        在途任务数限制为 workers * IN_FLIGHT_PER_WORKER，进度按完成数更新
+        """
+        max_in_flight = self.workers * IN_FLIGHT_PER_WORKER
+        pending = {}
+
+        with ProcessPoolExecutor(max_workers=self.workers,
+                                 initializer=_init_worker,
+                                 initargs=(self._worker_options(),)) as executor:
+            while True:
+                # 补充任务直到达到在途上限
+                for file_path in files:
+                    pending[executor.submit(_process_in_worker, file_path)] = file_path
+                    if len(pending) >= max_in_flight:
+                        break
+
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    self._collect(future, pending.pop(future))
+                    self.completed += 1
+                    self._print_progress()
+
+    def run(self):
+        """执行压缩操作"""
+        print(f"输出目录: {self.output_dir}")
+
+        # 增量模式：根据清单跳过未变化的图片
+        if self.incremental:
+            self.manifest = CompressManifest(self.output_dir / MANIFEST_NAME, self._settings_key())
+
+        # 发现线程边遍历边投递，处理阶段立即开始，内存占用只取决于队列容量
+        file_queue = queue.Queue(maxsize=DISCOVERY_QUEUE_SIZE)
+        discovery = threading.Thread(target=self._discover, args=(file_queue,), daemon=True)
+        discovery.start()
+
+        try:
+            if self.workers > 1:
+                print(f"并行进程数: {self.workers}")
+                self._run_parallel(self._drain(file_queue))
+            else:
+                self._run_serial(self._drain(file_queue))
+        finally:
+            if self.manifest:
+                self.manifest.close()
+                self.manifest = None
+
+        self._print_progress()
+
         # 打印最终统计
         print("\n\nCompression complete!")
+        print(f"发现图片数量: {self.discovered}")
         print(f"已处理文件数量: {self.stats['processed']}")
         print(f"跳过文件数量: {self.stats['skipped']}")
+        if self.incremental:
+            print(f"未变化文件数量: {self.stats['unchanged']}")
         print(f"原始文件总大小: {self.stats['original_size'] / 1024 / 1024:.2f} MB")
         print(f"压缩后文件总大小: {self.stats['compressed_size'] / 1024 / 1024:.2f} MB")
         print(f"节省空间: {(self.stats['original_size'] - self.stats['compressed_size']) / 1024 / 1024:.2f} MB")
         print(f"处理时长: {time.time() - self.start_time:.2f} seconds")
+        if self.stats['thumbnails']:
+            print(f"生成缩略图数量: {self.stats['thumbnails']}")
+        if self.stats['strategies']:
+            print("编码策略: " + ", ".join(f"{name}={count}" for name, count in
+                                          sorted(self.stats['strategies'].items())))
 
         if self.stats['errors']:
             print("\n发生错误:")
@@ -137,27 +632,55 @@ class ImageCompressor:
 
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("使用方法: python compress_images.py <input_directory> <output_directory>")
-        sys.exit(1)
-
-    input_dir = sys.argv[1]
-    output_dir = sys.argv[2]
+    parser = argparse.ArgumentParser(description="图片压缩工具")
+    parser.add_argument("input_dir", help="输入图片目录")
+    parser.add_argument("output_dir", help="输出目录")
+    parser.add_argument("--workers", "-w", type=int, default=1,
+                        help="并行进程数（默认 1，即单进程）")
+    parser.add_argument("--incremental", "-i", action="store_true",
+                        help="增量模式：根据输出目录中的清单跳过未变化的图片")
+    parser.add_argument("--strategy", choices=['auto', 'fixed'], default='auto',
+                        help="auto: 试验多个候选编码取最小; fixed: 单一固定参数（默认 auto）")
+    parser.add_argument("--min-psnr", type=float, default=30.0,
+                        help="有损候选的最低 PSNR(dB)，默认 30")
+    parser.add_argument("--min-ssim", type=float, default=None,
+                        help="有损候选的最低 SSIM（0-1，需要 numpy），默认不检查")
+    parser.add_argument("--trial-budget", type=float, default=5.0,
+                        help="单张图片试验候选编码的时间预算（秒），默认 5")
+    parser.add_argument("--max-dimension", type=int, default=None,
+                        help="输出图片最长边像素上限（只缩小不放大）")
+    parser.add_argument("--target-width", type=int, default=None,
+                        help="输出图片宽度（等比缩放，只缩小不放大）")
+    parser.add_argument("--thumbnails", default='',
+                        help="额外生成的缩略图最长边，逗号分隔，如 128,256,512")
+    args = parser.parse_args()
 
-    input_path = Path(input_dir)
+    input_path = Path(args.input_dir)
     if not input_path.exists():
-        print(f"Error: Input directory '{input_dir}' does not exist")
+        print(f"Error: Input directory '{args.input_dir}' does not exist")
         sys.exit(1)
 
     # 配置压缩参数（可自定义调整）
     compressor = ImageCompressor(
-        input_dir=input_dir,
-        output_dir=output_dir,
+        input_dir=args.input_dir,
+        output_dir=args.output_dir,
         quality=80,  # 推荐质量参数：80-85
-        optimize=True  # 启用优化选项
+        optimize=True,  # 启用优化选项
+        workers=args.workers,
+        incremental=args.incremental,
+        strategy=args.strategy,
+        min_psnr=args.min_psnr,
+        min_ssim=args.min_ssim,
+        trial_budget=args.trial_budget,
+        max_dimension=args.max_dimension,
+        target_width=args.target_width,
+        thumbnail_sizes=[int(size) for size in args.thumbnails.split(',') if size.strip()]
     )
 
     compressor.run()
 
 #  pip install pillow
 #  eg: python .\image-compress.py E:\images E:\compressed_images
+#  eg: python .\image-compress.py E:\images E:\compressed_images --workers 8
+#  eg: python .\image-compress.py E:\images E:\compressed_images --workers 8 --incremental
+#  eg: python .\image-compress.py E:\images E:\thumbs --max-dimension 1920 --thumbnails 256,512
@@ -1,88 +1,1206 @@
 import os
+import errno
+import glob
+import json
+import queue
+import re
+import hashlib
 import shutil
+import sqlite3
+import tempfile
+import threading
+import contextlib
+import datetime
+import io
 import pandas as pd
 import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from watchdog.observers import Observer
 from watchdog.events import PatternMatchingEventHandler
 
-def batch_filename(directory, prefix):
+UNDO_LOG_PATTERN = re.compile(r'rename-undo-\d{8}-\d{6}\.json')
+
+
+def plan_renames(directory, prefix, width=3, exclude=()):
     """
-    批量命令指定目录下面的文件名
+    计算批量重命名计划, 不修改任何文件
+    已经是 "前缀_编号.扩展名" 的文件保留原名和编号, 其他文件按文件名顺序分配未使用的编号
+    batch_filename 默认生成的撤销日志(rename-undo-时间.json)不参与重命名
     :param directory: 文件目录
     :param prefix: 文件名前缀
+    :param width: 编号位数
+    :param exclude: 不参与重命名的文件名
+    :return: (重命名计划 [(原文件名, 新文件名)], 已经命名正确的文件数)
     """
-    for count, filename in enumerate(os.listdir(directory)):
+    pattern = re.compile(rf'{re.escape(prefix)}_(\d+)')
+    files = []
+    reserved = set()
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name not in exclude and not UNDO_LOG_PATTERN.fullmatch(entry.name):
+                files.append(entry.name)
+            else:
+                reserved.add(entry.name)
+    files.sort()
+
+    used = set()
+    todo = []
+    for filename in files:
+        match = pattern.fullmatch(os.path.splitext(filename)[0])
+        if match and int(match.group(1)) not in used:
+            used.add(int(match.group(1)))
+        else:
+            todo.append(filename)
+
+    plan = []
+    number = 0
+    for filename in todo:
         ext = os.path.splitext(filename)[1]
-        new_filename = "{}_{}{}".format(prefix, str(count).zfill(3), ext)
-        os.rename(os.path.join(directory, filename), os.path.join(directory, new_filename))
+        while True:
+            new_filename = "{}_{}{}".format(prefix, str(number).zfill(width), ext)
+            number += 1
+            if number - 1 not in used and new_filename not in reserved:
+                break
+        used.add(number - 1)
+        plan.append((filename, new_filename))
+    return plan, len(files) - len(todo)
+
+
+def _order_renames(directory, plan):
+    """
+    把重命名计划排成可以依次执行的顺序
+    目标被其他待移动文件占用时先移动占用者, 形成环时借助临时文件名打断
+    :return: (执行顺序 [(原文件名, 新文件名)], 打断的环数)
+    """
+    pending = dict(plan)
+    if len(set(pending.values())) != len(pending):
+        raise ValueError('重命名计划中有多个文件的目标相同')
+    for src, dst in plan:
+        if dst not in pending and os.path.lexists(os.path.join(directory, dst)):
+            raise FileExistsError(f'目标文件已存在: {dst}')
+
+    by_target = {dst: src for src, dst in plan}
+    ready = deque(src for src, dst in plan if dst not in pending)
+    ordered = []
+    cycles = 0
+    while pending:
+        while ready:
+            src = ready.popleft()
+            ordered.append((src, pending.pop(src)))
+            # 原文件名空出来了, 以它为目标的文件可以移动
+            waiting = by_target.get(src)
+            if waiting in pending:
+                ready.append(waiting)
+        if pending:
+            src, dst = next(iter(pending.items()))
+            temp = f'.rename-{os.getpid()}-{cycles}.tmp'
+            ordered.append((src, temp))
+            del pending[src]
+            pending[temp] = dst
+            by_target[dst] = temp
+            ready.append(by_target[src])
+            cycles += 1
+    return ordered, cycles
+
+
+def undo_renames(undo_log):
+    """
+    按撤销日志把文件名改回去, 可以对中断的运行重复执行
+    :param undo_log: batch_filename 写出的撤销日志
+    """
+    with open(undo_log, 'r', encoding='utf-8') as f:
+        log = json.load(f)
+    directory = log['directory']
+    restored = 0
+    for src, dst in reversed(log['renames']):
+        src_path = os.path.join(directory, src)
+        dst_path = os.path.join(directory, dst)
+        if os.path.lexists(dst_path) and not os.path.lexists(src_path):
+            os.rename(dst_path, src_path)
+            restored += 1
+    print(f'已撤销 {restored} 次重命名')
+
+
+def batch_filename(directory, prefix, dry_run=False, undo_log=None, width=3):
+    """
+    批量命令指定目录下面的文件名
+    先在内存中算出完整的重命名计划, 检查冲突后按依赖顺序执行, 已经命名正确的文件不会再改名
+    :param directory: 文件目录
+    :param prefix: 文件名前缀
+    :param dry_run: 只打印计划, 不执行
+    :param undo_log: 撤销日志路径, 默认在当前目录生成 rename-undo-时间.json, 日志文件不参与重命名
+    :param width: 编号位数
+    :return: 执行顺序 [(原文件名, 新文件名)]
+    """
+    if undo_log is None:
+        undo_log = time.strftime('rename-undo-%Y%m%d-%H%M%S.json')
+    # 撤销日志写在被重命名的目录里时, 不能把它自己也改名
+    exclude = set()
+    if os.path.dirname(os.path.abspath(undo_log)) == os.path.abspath(directory):
+        exclude.add(os.path.basename(undo_log))
+    plan, unchanged = plan_renames(directory, prefix, width, exclude)
+    ordered, cycles = _order_renames(directory, plan)
+
+    if dry_run:
+        for src, dst in ordered:
+            print(f'{src} -> {dst}')
+        print(f'计划重命名 {len(plan)} 个文件, {unchanged} 个已经命名正确, 需要 {len(ordered)} 次重命名')
+        return ordered
+    if not ordered:
+        print(f'{unchanged} 个文件都已经命名正确')
+        return ordered
+
+    # 执行前先写撤销日志, 中途失败也可以撤销已经完成的部分
+    with open(undo_log, 'w', encoding='utf-8') as f:
+        json.dump({'directory': os.path.abspath(directory), 'renames': ordered}, f, ensure_ascii=False)
+
+    for src, dst in ordered:
+        os.rename(os.path.join(directory, src), os.path.join(directory, dst))
+    print(f'已重命名 {len(plan)} 个文件({len(ordered)} 次重命名, 打断 {cycles} 个环), '
+          f'{unchanged} 个已经命名正确, 撤销日志: {undo_log}')
+    return ordered
 # batch_filename('./dir', 'project')
+# batch_filename('./dir', 'project', dry_run=True)
+# undo_renames('rename-undo-20240101-120000.json')
+
+
+def _unique_name(filename, taken):
+    """目标目录中已有同名文件时, 在文件名后加 (1)、(2)..."""
+    if filename not in taken:
+        return filename
+    stem, ext = os.path.splitext(filename)
+    index = 1
+    while f'{stem} ({index}){ext}' in taken:
+        index += 1
+    return f'{stem} ({index}){ext}'
+
 
+def _copy_and_remove(src, dst):
+    """跨设备移动: 复制后删除原文件, 返回复制的字节数"""
+    shutil.copy2(src, dst)
+    size = os.path.getsize(dst)
+    os.remove(src)
+    return size
 
-def organize_files(directory):
+
+def organize_files(directory, recursive=False, target_dir=None, copy_workers=4, progress_interval=1.0):
     """
     根据文件扩展名自动整理文件夹内容
+    同一设备上直接 os.rename, 跨设备时交给线程池复制后删除
     :param directory: 文件目录
-    :return:
+    :param recursive: 是否同时整理子目录中的文件
+    :param target_dir: 扩展名文件夹所在的目录, 默认为 directory
+    :param copy_workers: 跨设备复制的线程数
+    :param progress_interval: 打印进度的间隔(秒)
+    :return: 统计信息
     """
-    for filename in os.listdir(directory):
-        if os.path.isdir(os.path.join(directory, filename)):
-            ext = filename.split(".")[-1]
-            ext_folder = os.path.join(directory, ext)
-            if not os.path.exists(ext_folder):
-                os.makedirs(ext_folder)
-            shutil.move(os.path.join(directory, filename), os.path.join(ext_folder, filename))
+    target_dir = os.path.abspath(target_dir or directory)
+    # 扩展名 -> (文件夹路径, 文件夹中已有的文件名), 每个文件夹只创建和列出一次
+    folders = {}
+    stats = {'moved': 0, 'copied': 0, 'copied_bytes': 0, 'skipped': 0, 'errors': []}
+    slots = threading.Semaphore(copy_workers * 2)
+    lock = threading.Lock()
+    start = last_report = time.perf_counter()
+
+    def report(final=False):
+        elapsed = time.perf_counter() - start
+        done = stats['moved'] + stats['copied']
+        prefix = '整理完成' if final else '整理中'
+        print(f'{prefix}: 已移动 {done} 个文件(其中跨设备复制 {stats["copied"]} 个, '
+              f'{stats["copied_bytes"] / 1024 / 1024:.1f} MB), {done / elapsed if elapsed else 0:.0f} 个/秒')
+
+    def copy_done(future, src):
+        slots.release()
+        with lock:
+            try:
+                stats['copied_bytes'] += future.result()
+                stats['copied'] += 1
+            except OSError as e:
+                stats['errors'].append((src, str(e)))
+
+    with ThreadPoolExecutor(max_workers=copy_workers) as executor:
+        pending_dirs = [os.path.abspath(directory)]
+        while pending_dirs:
+            current = pending_dirs.pop()
+            # 无权限或整理过程中被删除的子目录只记录错误, 不中断整个整理
+            try:
+                with os.scandir(current) as entries:
+                    entries = list(entries)
+            except OSError as e:
+                stats['errors'].append((current, str(e)))
+                continue
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        pending_dirs.append(entry.path)
+                    continue
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+
+                ext = os.path.splitext(entry.name)[1][1:].lower() or 'others'
+                if ext not in folders:
+                    folder = os.path.join(target_dir, ext)
+                    try:
+                        os.makedirs(folder, exist_ok=True)
+                        folders[ext] = (folder, set(os.listdir(folder)))
+                    except OSError as e:
+                        stats['errors'].append((entry.path, str(e)))
+                        continue
+                folder, taken = folders[ext]
+                if current == folder:
+                    stats['skipped'] += 1
+                    continue
+
+                name = _unique_name(entry.name, taken)
+                taken.add(name)
+                dst = os.path.join(folder, name)
+                try:
+                    os.rename(entry.path, dst)
+                    stats['moved'] += 1
+                except OSError as e:
+                    if e.errno != errno.EXDEV:
+                        stats['errors'].append((entry.path, str(e)))
+                        continue
+                    slots.acquire()
+                    future = executor.submit(_copy_and_remove, entry.path, dst)
+                    future.add_done_callback(lambda f, src=entry.path: copy_done(f, src))
+
+                if time.perf_counter() - last_report >= progress_interval:
+                    last_report = time.perf_counter()
+                    report()
+
+    report(final=True)
+    for src, error in stats['errors']:
+        print(f'  整理失败: {src}: {error}')
+    return stats
 # organize_files('./downloads')
+# organize_files('./downloads', recursive=True, target_dir='/mnt/archive/downloads')
+
+
+def _clean_excel(df):
+    """process_excel 的清洗逻辑: 丢弃有空值的行并计算 Processed_Column"""
+    df = df.dropna()
+    df['Processed_Column'] = df['Original_Column'] * 2
+    return df
 
 
-def process_excel(file_path):
+def process_excel(file_path, schema_path=None, cache_dir=None, output_path=None,
+                  streaming=False, usecols=None, batch_size=10_000):
     """
     对 excel 数据进行清洗, 并保存成新的文件
     :param file_path:
-    :return:
+    :param schema_path: 列类型 schema 文件(json), 不存在时抽样推断后保存
+    :param cache_dir: Parquet 缓存目录, 文件内容未变时跳过 excel 解析
+    :param output_path: 输出文件, 按扩展名保存为 .xlsx / .csv / .parquet, 默认在原文件旁边, 文件名前加 processed_
+    :param streaming: 使用 openpyxl 只读模式逐行读取、分批写出, 内存占用与行数无关
+    :param usecols: 只读取这些列(需包含 Original_Column), 为 None 时读取全部列
+    :param batch_size: 流式模式下每批的行数
+    :return: 写出的行数
     """
-    df = pd.read_excel(file_path)
-    df.dropna(inplace=True)
-    df['Processed_Column'] = df['Original_Column'] * 2
-    output_path = 'processed' + file_path
-    df.to_excel(output_path, index=False)
+    if output_path is None:
+        directory, filename = os.path.split(file_path)
+        output_path = os.path.join(directory, 'processed_' + filename)
+    dtype = None
+    if schema_path:
+        dtype = load_schema(schema_path, [file_path], lambda file, rows: pd.read_excel(file, nrows=rows, dtype=str))
+
+    rows = 0
+    if streaming:
+        # 各批共用同一份列类型: 先按 schema(没有时按第一批)固定, 后面的批出现放不下的值时放宽类型并从头重新处理
+        pinned = dict(dtype or {})
+
+        def parse_chunks():
+            return _read_excel_batches(file_path, usecols, batch_size, pinned)
+
+        while True:
+            if cache_dir:
+                # 只读模式和 usecols 会影响解析结果, 一并作为缓存 key
+                cache = ColumnarCache(cache_dir, {'schema': dtype, 'usecols': usecols, 'reader': 'read_only'})
+                batches = cache.iter_chunks(file_path, parse_chunks, batch_size)
+            else:
+                batches = parse_chunks()
+            rows = 0
+            try:
+                with TableWriter(output_path) as writer:
+                    for df in batches:
+                        df = _clean_excel(df)
+                        writer.write(df)
+                        rows += len(df)
+                break
+            except SchemaMismatchError as e:
+                print(f'{e}, 已放宽列类型并重新处理')
+                if schema_path:
+                    save_schema(schema_path, pinned)
+    else:
+        def parse():
+            return pd.read_excel(file_path, dtype=dtype, usecols=usecols)
+
+        df = ColumnarCache(cache_dir, dtype).read(file_path, parse) if cache_dir and usecols is None else parse()
+        df = _clean_excel(df)
+        if output_path.lower().endswith(('.csv', '.parquet')):
+            with TableWriter(output_path) as writer:
+                writer.write(df)
+        else:
+            # 同样先写临时文件, 成功后再替换
+            temp_path = _sibling_temp_path(output_path)
+            try:
+                df.to_excel(temp_path, index=False)
+                os.replace(temp_path, output_path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+        rows = len(df)
     print(f'处理完成,以保存到{output_path}')
+    return rows
 # process_excel('./sale_data.xlsx')
+# process_excel('./sale_data.xlsx', schema_path='./sale_schema.json', cache_dir='./.cache')
+# process_excel('./sale_data.xlsx', output_path='./sale_data.parquet', streaming=True, usecols=['Original_Column'])
+
+
+EXCEL_EXTENSIONS = ('.xlsx', '.xlsm')
+
+
+def _find_workbooks(source):
+    """
+    查找需要处理的工作簿
+    :param source: 目录(递归查找)或 glob 模式(支持 **)
+    :return: (基准目录, 工作簿列表), 输出目录按基准目录镜像
+    """
+    if os.path.isdir(source):
+        base_dir = source
+        files = []
+        for root, _, filenames in os.walk(source):
+            files.extend(os.path.join(root, filename) for filename in filenames
+                         if filename.lower().endswith(EXCEL_EXTENSIONS) and not filename.startswith('~$'))
+    else:
+        files = [file for file in glob.glob(source, recursive=True)
+                 if os.path.isfile(file) and not os.path.basename(file).startswith('~$')]
+        base_dir = os.path.commonpath([os.path.dirname(os.path.abspath(file)) for file in files]) if files else '.'
+    return base_dir, sorted(files)
+
+
+def _process_excel_task(file_path, output_path, options):
+    """工作进程中处理一个工作簿, 返回 (行数, 耗时, 错误信息)"""
+    start = time.perf_counter()
+    try:
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        with contextlib.redirect_stdout(io.StringIO()):
+            rows = process_excel(file_path, output_path=output_path, **options)
+        return rows, time.perf_counter() - start, None
+    except Exception as e:
+        return 0, time.perf_counter() - start, f'{type(e).__name__}: {e}'
+
+
+def process_excel_batch(source, output_dir, workers=None, output_format=None, report_path=None, **options):
+    """
+    批量处理工作簿, 多进程并行, 输出到与输入目录结构一致的镜像目录
+    :param source: 输入目录或 glob 模式, 如 './month_end/**/*.xlsx'
+    :param output_dir: 输出根目录
+    :param workers: 进程数, 默认 CPU 核数
+    :param output_format: 输出扩展名 .xlsx / .csv / .parquet, 默认与输入相同
+    :param report_path: 把每个文件的结果写入该 json 文件
+    :param options: 传给 process_excel 的其他参数, 如 streaming=True, usecols=[...]
+    :return: 每个文件的结果列表
+    """
+    base_dir, files = _find_workbooks(source)
+    if not files:
+        print(f'没有找到需要处理的工作簿: {source}')
+        return []
+
+    # schema 只在主进程推断一次, 避免多个进程同时写 schema 文件
+    schema_path = options.get('schema_path')
+    if schema_path and not os.path.exists(schema_path):
+        load_schema(schema_path, files[:8], lambda file, rows: pd.read_excel(file, nrows=rows, dtype=str))
+
+    tasks = {}
+    for file in files:
+        relative = os.path.relpath(os.path.abspath(file), os.path.abspath(base_dir))
+        if output_format:
+            relative = os.path.splitext(relative)[0] + output_format
+        tasks[file] = os.path.join(output_dir, relative)
+
+    results = []
+    total_rows = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_process_excel_task, file, output_path, options): file
+                   for file, output_path in tasks.items()}
+        for future in as_completed(futures):
+            file = futures[future]
+            rows, seconds, error = future.result()
+            total_rows += rows
+            results.append({
+                'file': file,
+                'output': tasks[file],
+                'rows': rows,
+                'seconds': round(seconds, 3),
+                'rows_per_sec': round(rows / seconds, 1) if seconds and not error else None,
+                'error': error,
+            })
+            if error:
+                print(f'[{len(results)}/{len(files)}] 处理失败 {file}: {error}')
+            else:
+                print(f'[{len(results)}/{len(files)}] {file}: {rows} 行, {rows / seconds if seconds else 0:.0f} 行/秒')
+
+    elapsed = time.perf_counter() - start
+    failures = [result for result in results if result['error']]
+    print(f'批量处理完成: {len(files) - len(failures)} 个成功, {len(failures)} 个失败, '
+          f'共 {total_rows} 行, 耗时 {elapsed:.1f} 秒, {total_rows / elapsed if elapsed else 0:.0f} 行/秒')
+    for failure in failures:
+        print(f'  失败: {failure["file"]}: {failure["error"]}')
+
+    if report_path:
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return results
+# process_excel_batch('./month_end', './month_end_processed', streaming=True)
+# process_excel_batch('./month_end/**/*.xlsx', './month_end_processed', output_format='.parquet', report_path='report.json')
+
+
+def _file_digest(file_path, chunk_size=1024 * 1024):
+    """计算文件内容的 blake2b 摘要"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _infer_dtype(values, category_ratio):
+    """
+    根据字符串样本推断一列的类型
+    :param values: 以字符串读取的样本列
+    :param category_ratio: 不同值占比不超过该比例时使用 category
+    """
+    values = values.dropna()
+    if values.empty:
+        return 'str'
+    # 带前导零的编号(如 007)按字符串保留
+    if not values.str.match(r'^[+-]?0\d').any():
+        numbers = pd.to_numeric(values, errors='coerce')
+        if numbers.notna().all():
+            if values.str.fullmatch(r'[+-]?\d+').all():
+                return 'Int64'
+            return 'float64'
+    if values.nunique() <= max(1, int(len(values) * category_ratio)):
+        return 'category'
+    return 'str'
+
+
+def infer_schema(files, read_sample, sample_rows=10_000, category_ratio=0.05):
+    """
+    抽样推断列类型
+    :param files: 文件列表
+    :param read_sample: 读取样本的函数 (file, rows) -> 以字符串读取的 DataFrame
+    :param sample_rows: 每个文件抽样的行数
+    :param category_ratio: 不同值占比不超过该比例的列使用 category
+    :return: {列名: dtype}
+    """
+    sample = pd.concat([read_sample(file, sample_rows) for file in files], ignore_index=True)
+    return {column: _infer_dtype(sample[column], category_ratio) for column in sample.columns}
+
+
+def load_schema(schema_path, files, read_sample, sample_rows=10_000):
+    """
+    读取保存好的 schema, 不存在时抽样推断并保存, 之后的运行直接复用
+    :param schema_path: schema 文件(json)
+    :param files: 用于推断的文件列表
+    :param read_sample: 读取样本的函数 (file, rows) -> DataFrame
+    :param sample_rows: 每个文件抽样的行数
+    :return: {列名: dtype}
+    """
+    if os.path.exists(schema_path):
+        with open(schema_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    schema = infer_schema(files, read_sample, sample_rows)
+    save_schema(schema_path, schema)
+    print(f'已推断列类型并保存到 {schema_path}')
+    return schema
+
+
+def save_schema(schema_path, schema):
+    with open(schema_path, 'w', encoding='utf-8') as f:
+        json.dump(schema, f, ensure_ascii=False, indent=2)
+
+
+class SchemaMismatchError(ValueError):
+    """文件内容与列类型 schema 不符(抽样之外的行出现了无法转换的值)"""
+
+    def __init__(self, file, error):
+        super().__init__(f'{file} 与列类型 schema 不符: {error}')
+        self.file = file
+
+
+def _widen_schema(schema, file, chunksize=100_000):
+    """
+    按整个文件的实际内容放宽 schema: 含非整数的 Int64 列改为 float64, 含非数字的数值列改为 str
+    :param schema: {列名: dtype}
+    :param file: 与 schema 不符的 csv 文件
+    :return: 放宽后的 schema, 没有可以放宽的列时返回 None
+    """
+    widened = dict(schema)
+    for chunk in pd.read_csv(file, chunksize=chunksize, dtype=str):
+        for column in chunk.columns:
+            if widened.get(column) not in ('Int64', 'float64'):
+                continue
+            values = chunk[column].dropna()
+            if pd.to_numeric(values, errors='coerce').isna().any():
+                widened[column] = 'str'
+            elif widened[column] == 'Int64' and not values.str.fullmatch(r'\s*[+-]?\d+\s*').all():
+                widened[column] = 'float64'
+    return widened if widened != schema else None
+
+
+def _arrow_table(chunk):
+    """DataFrame 转 Arrow 表, category 列统一使用 int32 索引, 保证各块写入同一个 Parquet 时 schema 一致"""
+    import pyarrow as pa
+    table = pa.Table.from_pandas(chunk, preserve_index=False)
+    fields = [pa.field(field.name, pa.dictionary(pa.int32(), field.type.value_type))
+              if pa.types.is_dictionary(field.type) else field
+              for field in table.schema]
+    return table.cast(pa.schema(fields, metadata=table.schema.metadata))
+
+
+class ColumnarCache:
+    """
+    解析结果的 Parquet 缓存
+    以文件内容哈希和 schema 作为 key, 输入文件不变时直接读取 Parquet, 跳过 csv/excel 解析
+    """
+
+    def __init__(self, cache_dir, schema=None):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        schema_json = json.dumps(schema, sort_keys=True)
+        self.schema_key = hashlib.blake2b(schema_json.encode('utf-8'), digest_size=8).hexdigest()
+
+    def _path(self, file_path):
+        return os.path.join(self.cache_dir, f'{_file_digest(file_path)}-{self.schema_key}.parquet')
+
+    def _temp_path(self, path):
+        return f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+    def read(self, file_path, parse):
+        """
+        读取整个文件
+        :param file_path: 输入文件
+        :param parse: 缓存未命中时调用的解析函数, 返回 DataFrame
+        """
+        path = self._path(file_path)
+        if os.path.exists(path):
+            return pd.read_parquet(path)
+
+        df = parse()
+        temp_path = self._temp_path(path)
+        df.to_parquet(temp_path, index=False)
+        os.replace(temp_path, path)
+        return df
+
+    def iter_chunks(self, file_path, parse_chunks, chunksize):
+        """
+        按块读取文件, 缓存未命中时边解析边写入缓存
+        :param file_path: 输入文件
+        :param parse_chunks: 缓存未命中时调用, 返回 DataFrame 块的迭代器
+        :param chunksize: 命中缓存时每块的行数
+        """
+        import pyarrow.parquet as pq
+
+        path = self._path(file_path)
+        if os.path.exists(path):
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+                yield batch.to_pandas()
+            return
+
+        temp_path = self._temp_path(path)
+        writer = None
+        try:
+            for chunk in parse_chunks():
+                table = _arrow_table(chunk)
+                if writer is None:
+                    writer = pq.ParquetWriter(temp_path, table.schema)
+                writer.write_table(table.cast(writer.schema))
+                yield chunk
+        except BaseException:
+            if writer is not None:
+                writer.close()
+                os.remove(temp_path)
+            raise
+
+        if writer is not None:
+            writer.close()
+            os.replace(temp_path, path)
+
+
+def _excel_dtype(values):
+    """
+    根据 openpyxl 读出的单元格值推断一列的类型
+    :param values: 一批中某一列的值
+    :return: dtype, 全为空时返回 None
+    """
+    types = {type(value) for value in values if value is not None}
+    if not types:
+        return None
+    if types == {bool}:
+        return 'boolean'
+    if types <= {int}:
+        return 'Int64'
+    if types <= {int, float}:
+        return 'float64'
+    if types <= {datetime.datetime}:
+        return 'datetime64[ns]'
+    return 'str'
+
+
+def _promote_dtype(current, kind):
+    """
+    放宽列类型, 使其同时容纳已有的值和新的一批值: Int64 + float64 -> float64, 其他不一致的组合 -> str
+    :param current: 当前固定的 dtype, 未固定时为 None
+    :param kind: 新一批值推断出的 dtype
+    """
+    if current is None:
+        return kind
+    if kind is None or kind == current or current in ('str', 'category'):
+        return current
+    if {current, kind} <= {'Int64', 'float64'}:
+        return 'float64'
+    return 'str'
+
+
+def _cast_excel_batch(df, dtype):
+    """按固定的列类型转换一批数据, str 列保留空值"""
+    for column in df.columns:
+        target = dtype.get(column)
+        if target is None:
+            continue
+        if target == 'str':
+            df[column] = df[column].astype(str).where(df[column].notna(), None)
+        else:
+            df[column] = df[column].astype(target)
+    return df
+
+
+def _read_excel_batches(file_path, usecols=None, batch_size=10_000, dtype=None):
+    """
+    使用 openpyxl 只读模式逐行读取第一个工作表, 按批产出 DataFrame
+    :param file_path: excel 文件
+    :param usecols: 只保留这些列, 为 None 时保留全部列
+    :param batch_size: 每批的行数
+    :param dtype: 列类型 {列名: dtype}, 所有批都按它转换; 未列出的列按第一批的值固定类型并写回 dtype.
+                  已产出过数据后某列需要放宽类型时, 放宽后的类型写回 dtype 并抛出 SchemaMismatchError, 调用方按新类型从头重读
+    """
+    from openpyxl import load_workbook
+
+    if dtype is None:
+        dtype = {}
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = list(header)
+        if usecols is None:
+            indexes = [index for index, column in enumerate(header) if column is not None]
+        else:
+            missing = [column for column in usecols if column not in header]
+            if missing:
+                raise ValueError(f'{file_path} 中没有这些列: {missing}')
+            indexes = [header.index(column) for column in usecols]
+        columns = [header[index] for index in indexes]
+
+        def make_batch(batch, first):
+            df = pd.DataFrame(batch, columns=columns)
+            promoted = {}
+            for column in columns:
+                current = dtype.get(column)
+                kind = _promote_dtype(current, _excel_dtype(df[column]))
+                if kind != current:
+                    dtype[column] = promoted[column] = kind
+            if promoted and not first:
+                raise SchemaMismatchError(file_path, f'列类型需要放宽为 {promoted}')
+            return _cast_excel_batch(df, dtype)
+
+        batch = []
+        first = True
+        for row in rows:
+            batch.append([row[index] if index < len(row) else None for index in indexes])
+            if len(batch) >= batch_size:
+                yield make_batch(batch, first)
+                batch = []
+                first = False
+        if batch:
+            yield make_batch(batch, first)
+    finally:
+        workbook.close()
+
 
+def _sibling_temp_path(path):
+    """与 path 同目录、同扩展名的临时文件路径, 写完后 os.replace 到 path 是同一文件系统内的原子替换"""
+    root, ext = os.path.splitext(path)
+    return f'{root}.tmp-{os.getpid()}-{threading.get_ident()}{ext}'
 
-def merge_csv(directory):
+
+class TableWriter:
+    """
+    按扩展名分批写出 DataFrame
+    .xlsx 使用 openpyxl write-only 模式, .csv 追加写入, .parquet 使用 ParquetWriter
+    先写到同目录的临时文件, close 时替换 output_path; 出错退出 with 块时丢弃临时文件, 已有的输出保持不变
+    """
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.temp_path = _sibling_temp_path(output_path)
+        self.format = os.path.splitext(output_path)[1].lower()
+        self.writer = None
+        self.sheet = None
+        self.header = True
+
+    def write(self, df):
+        if self.format == '.csv':
+            df.to_csv(self.temp_path, index=False, header=self.header, mode='w' if self.header else 'a')
+        elif self.format == '.parquet':
+            import pyarrow.parquet as pq
+            table = _arrow_table(df)
+            if self.writer is None:
+                self.writer = pq.ParquetWriter(self.temp_path, table.schema)
+            self.writer.write_table(table.cast(self.writer.schema))
+        else:
+            if self.writer is None:
+                from openpyxl import Workbook
+                self.writer = Workbook(write_only=True)
+                self.sheet = self.writer.create_sheet()
+            if self.header:
+                self.sheet.append(list(df.columns))
+            values = df.astype(object).where(df.notna(), None)
+            for row in values.itertuples(index=False, name=None):
+                self.sheet.append(row)
+        self.header = False
+
+    def close(self):
+        """写完全部数据后调用: 保存并替换 output_path"""
+        if self.writer is not None:
+            if self.format == '.parquet':
+                self.writer.close()
+            else:
+                self.writer.save(self.temp_path)
+            self.writer = None
+        if os.path.exists(self.temp_path):
+            os.replace(self.temp_path, self.output_path)
+
+    def discard(self):
+        """放弃已写入的内容, 不修改 output_path"""
+        if self.writer is not None:
+            # 关闭写到一半的 ParquetWriter / 工作表, 释放底层的临时文件
+            if self.format == '.parquet':
+                self.writer.close()
+            else:
+                self.sheet.close()
+        self.writer = None
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+class RowDigestSet:
+    """
+    行摘要集合, 用于流式去重
+    先保存在内存中, 超出内存预算后转存到磁盘上的 SQLite 临时库
+    """
+    # 内存中每个摘要大约占用的字节数(int 对象 + 集合开销)
+    BYTES_PER_DIGEST = 120
+
+    def __init__(self, memory_budget=512 * 1024 * 1024):
+        self.max_in_memory = memory_budget // self.BYTES_PER_DIGEST
+        self.digests = set()
+        self.db = None
+        self.db_dir = None
+
+    def _spill(self):
+        """把内存中的摘要转存到磁盘"""
+        self.db_dir = tempfile.mkdtemp(prefix='merge-csv-')
+        self.db = sqlite3.connect(os.path.join(self.db_dir, 'digests.sqlite'))
+        self.db.execute('PRAGMA journal_mode=OFF')
+        self.db.execute('PRAGMA synchronous=OFF')
+        self.db.execute('CREATE TABLE seen (digest BLOB PRIMARY KEY) WITHOUT ROWID')
+        self.db.executemany('INSERT INTO seen VALUES (?)', ((d.to_bytes(16, 'big'),) for d in self.digests))
+        self.digests = set()
+        print(f'去重摘要超出内存预算, 已转存到磁盘: {self.db_dir}')
+
+    def add_new(self, digests):
+        """
+        加入一批摘要
+        :param digests: 摘要列表(已在批内去重)
+        :return: 每个摘要此前是否未出现过的布尔列表
+        """
+        if self.db is None:
+            is_new = [d not in self.digests for d in digests]
+            self.digests.update(digests)
+            if len(self.digests) > self.max_in_memory:
+                self._spill()
+            return is_new
+
+        keys = [d.to_bytes(16, 'big') for d in digests]
+        existing = set()
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ','.join('?' * len(batch))
+            existing.update(row[0] for row in self.db.execute(
+                f'SELECT digest FROM seen WHERE digest IN ({placeholders})', batch))
+        is_new = [key not in existing for key in keys]
+        self.db.executemany('INSERT INTO seen VALUES (?)', ((key,) for key, new in zip(keys, is_new) if new))
+        return is_new
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            shutil.rmtree(self.db_dir, ignore_errors=True)
+            self.db = None
+
+
+def _row_digests(chunk):
+    """计算每一行的 128 位摘要(两个不同 key 的 64 位哈希拼接)"""
+    low = pd.util.hash_pandas_object(chunk, index=False).to_numpy()
+    high = pd.util.hash_pandas_object(chunk, index=False, hash_key='merge_csv_digest').to_numpy()
+    return [(int(h) << 64) | int(l) for h, l in zip(high, low)]
+
+
+def _read_csv_chunks(csv_files, chunksize, workers, dtype=str, cache=None):
+    """
+    多线程按块读取多个 csv 文件, 通过有界队列逐块产出, 内存只与队列长度相关
+    :param csv_files: csv 文件列表
+    :param chunksize: 每块行数
+    :param workers: 同时读取的文件数
+    :param dtype: 列类型, 默认全部按字符串读取
+    :param cache: ColumnarCache, 为 None 时不使用缓存
+    """
+    chunks = queue.Queue(maxsize=workers * 2)
+    done = object()
+    stop = threading.Event()
+
+    def parse_file(file):
+        try:
+            yield from pd.read_csv(file, chunksize=chunksize, dtype=dtype)
+        except (ValueError, TypeError) as e:
+            if dtype is str:
+                raise
+            raise SchemaMismatchError(file, e) from e
+
+    def read_file(file):
+        try:
+            if cache is None:
+                file_chunks = parse_file(file)
+            else:
+                file_chunks = cache.iter_chunks(file, lambda: parse_file(file), chunksize)
+            for chunk in file_chunks:
+                if stop.is_set():
+                    break
+                chunks.put(chunk)
+        except Exception as e:
+            chunks.put(e)
+        finally:
+            chunks.put(done)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for file in csv_files:
+            executor.submit(read_file, file)
+
+        remaining = len(csv_files)
+        try:
+            while remaining:
+                item = chunks.get()
+                if item is done:
+                    remaining -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            # 提前退出时排空队列, 让阻塞在 put 上的读取线程能够结束
+            stop.set()
+            while remaining:
+                if chunks.get() is done:
+                    remaining -= 1
+
+
+def merge_csv(directory, output_path='merged_output.csv', chunksize=100_000, workers=4,
+              memory_budget=512 * 1024 * 1024, schema_path=None, cache_dir=None):
     """
     合并指定目录下面的所有的 .csv 文件
+    按块流式读取、按行摘要去重并逐块追加写出, 内存占用与文件总大小无关
     :param directory: 指定的目录
+    :param output_path: 输出文件, 按扩展名保存为 .csv / .parquet / .xlsx
+    :param chunksize: 每次读取的行数
+    :param workers: 并行读取的文件数, 为 1 时输出行顺序与原文件一致
+    :param memory_budget: 去重摘要在内存中的预算(字节), 超出后转存到磁盘
+    :param schema_path: 列类型 schema 文件(json), 不存在时抽样推断后保存; 为 None 时全部按字符串读取
+    :param cache_dir: Parquet 缓存目录, 输入文件未变时跳过 csv 解析
     :return:
     """
-    csv_files = [os.path.join(directory,file) for file in os.listdir(directory)]
-    dataframe = [pd.read_csv(file) for file in csv_files]
-    merged = pd.concat(dataframe, ignore_index=True).drop_duplicates()
-    merged.to_csv('merged_output.csv', index=False)
-    print(f'csv以合并完成, 结果以保存为 merged_output.csv');
+    csv_files = [os.path.join(directory, file) for file in sorted(os.listdir(directory))
+                 if file.lower().endswith('.csv')]
+    if not csv_files:
+        print('目录中没有 csv 文件')
+        return
+
+    # 只读表头, 得到所有文件的列并集, 保证逐块写出时列一致
+    columns = []
+    for file in csv_files:
+        for column in pd.read_csv(file, nrows=0).columns:
+            if column not in columns:
+                columns.append(column)
+
+    dtype = str
+    if schema_path:
+        dtype = load_schema(schema_path, csv_files, lambda file, rows: pd.read_csv(file, nrows=rows, dtype=str))
+
+    # TableWriter 先写到同目录的临时文件, 成功后再替换, 失败时不会破坏已有的输出
+    while True:
+        try:
+            rows_in, rows_out = _merge_csv_chunks(csv_files, columns, output_path, dtype, chunksize,
+                                                  workers, memory_budget, cache_dir)
+            break
+        except SchemaMismatchError as e:
+            # 抽样没有覆盖到的值: 按该文件的全部内容放宽 schema 并保存, 然后重新合并
+            widened = _widen_schema(dtype, e.file, chunksize)
+            if widened is None:
+                raise
+            changed = {column: widened[column] for column in widened if widened[column] != dtype.get(column)}
+            print(f'{e.file} 中有抽样之外的值, 放宽列类型后重新合并: {changed}')
+            dtype = widened
+            save_schema(schema_path, dtype)
+
+    print(f'csv以合并完成, 读取 {rows_in} 行, 去重后 {rows_out} 行, 结果以保存为 {output_path}')
+
+
+def _merge_csv_chunks(csv_files, columns, output_path, dtype, chunksize, workers, memory_budget, cache_dir):
+    """
+    merge_csv 的一次完整合并
+    :return: (读取的行数, 去重后的行数)
+    """
+    cache = ColumnarCache(cache_dir, None if dtype is str else dtype) if cache_dir else None
+    seen = RowDigestSet(memory_budget)
+    rows_in = rows_out = 0
+
+    try:
+        with TableWriter(output_path) as writer:
+            for chunk in _read_csv_chunks(csv_files, chunksize, workers, dtype, cache):
+                rows_in += len(chunk)
+                # 其他文件才有的列补成对应类型的空列
+                for column in columns:
+                    if column not in chunk.columns:
+                        column_dtype = dtype if dtype is str else dtype.get(column, str)
+                        chunk[column] = pd.Series(index=chunk.index, dtype=column_dtype)
+                chunk = chunk[columns]
+                digests = _row_digests(chunk)
+
+                # 先在块内去重, 再与之前出现过的行比较
+                first_in_chunk = ~pd.Series(digests).duplicated().to_numpy()
+                chunk = chunk[first_in_chunk]
+                digests = [d for d, keep in zip(digests, first_in_chunk) if keep]
+                chunk = chunk[seen.add_new(digests)]
+                if chunk.empty:
+                    continue
+
+                writer.write(chunk)
+                rows_out += len(chunk)
+
+            if rows_out == 0:
+                # 没有任何数据行时也输出表头
+                writer.write(pd.DataFrame(columns=columns))
+    finally:
+        seen.close()
+    return rows_in, rows_out
 # merge_csv('./dir')
+# merge_csv('./dir', 'merged_output.parquet', workers=8)
+# merge_csv('./dir', schema_path='./dir_schema.json', cache_dir='./.cache')
+
+
+FileEvent = namedtuple('FileEvent', ['kind', 'path', 'src_path'])
+
+
+class CoalescingEventQueue:
+    """
+    合并文件变更事件的队列
+    同一路径在 debounce 秒内的多次事件合并为一个(创建+修改 -> 创建, 创建+删除 -> 丢弃, 移动沿用原路径的事件),
+    静止后按批交给线程池处理; 线程池繁忙时暂停分发, 期间新事件继续在队列中合并
+    """
+
+    def __init__(self, handler, debounce=0.5, workers=4, batch_size=100, max_pending=10_000):
+        """
+        :param handler: 处理函数, 参数为 FileEvent 列表
+        :param debounce: 路径静止多少秒后才分发
+        :param workers: 处理线程数
+        :param batch_size: 每批最多的事件数
+        :param max_pending: 队列中最多的路径数, 超出时阻塞 watchdog 线程
+        """
+        self.handler = handler
+        self.debounce = debounce
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        # 路径 -> [事件类型, 移动前路径, 最后一次事件时间], 按最后一次事件时间排序
+        self.pending = {}
+        self.condition = threading.Condition()
+        self.slots = threading.Semaphore(workers * 2)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.counters = {'received': 0, 'dispatched': 0, 'batches': 0, 'cancelled': 0, 'failed': 0}
+        self.stopping = False
+        self.dispatcher = threading.Thread(target=self._dispatch_loop, daemon=True)
+        self.dispatcher.start()
+
+    def put(self, kind, path, dest_path=None):
+        """
+        加入一个事件
+        :param kind: created / modified / moved / deleted
+        :param path: 事件路径, 移动时为原路径
+        :param dest_path: 移动后的路径
+        """
+        with self.condition:
+            self.counters['received'] += 1
+            while len(self.pending) >= self.max_pending and path not in self.pending and not self.stopping:
+                self.condition.wait()
+
+            now = time.monotonic()
+            previous = self.pending.pop(path, None)
+            previous_kind = previous[0] if previous else None
+            if kind == 'moved':
+                if previous_kind == 'created':
+                    entry = ['created', None, now]
+                elif previous_kind == 'moved':
+                    entry = ['moved', previous[1], now]
+                else:
+                    entry = ['moved', path, now]
+                self.pending.pop(dest_path, None)
+                self.pending[dest_path] = entry
+            elif kind == 'deleted':
+                if previous_kind == 'created':
+                    self.counters['cancelled'] += 1
+                elif previous_kind == 'moved':
+                    # 移动后又被删除, 等同于删除原路径
+                    self.pending.pop(previous[1], None)
+                    self.pending[previous[1]] = ['deleted', None, now]
+                else:
+                    self.pending[path] = ['deleted', None, now]
+            elif kind == 'created' and previous_kind == 'deleted':
+                self.pending[path] = ['modified', None, now]
+            elif kind == 'modified' and previous_kind in ('created', 'moved'):
+                self.pending[path] = [previous_kind, previous[1], now]
+            else:
+                self.pending[path] = [kind, None, now]
+            self.condition.notify_all()
+
+    def _take_ready(self):
+        """取出已经静止 debounce 秒的事件, 停止时取出全部"""
+        now = time.monotonic()
+        batch = []
+        for path, (kind, src_path, last_seen) in self.pending.items():
+            if len(batch) >= self.batch_size or (not self.stopping and now - last_seen < self.debounce):
+                break
+            batch.append(FileEvent(kind, path, src_path))
+        for event in batch:
+            del self.pending[event.path]
+        return batch
+
+    def _dispatch_loop(self):
+        while True:
+            with self.condition:
+                batch = self._take_ready()
+                while not batch:
+                    if self.stopping and not self.pending:
+                        return
+                    timeout = None
+                    if self.pending:
+                        last_seen = next(iter(self.pending.values()))[2]
+                        timeout = max(0.0, last_seen + self.debounce - time.monotonic())
+                    self.condition.wait(timeout)
+                    batch = self._take_ready()
+                self.counters['dispatched'] += len(batch)
+                self.counters['batches'] += 1
+                self.condition.notify_all()
+
+            # 处理线程都在忙时在这里等待, 形成背压
+            self.slots.acquire()
+            self.executor.submit(self._run, batch)
+
+    def _run(self, batch):
+        try:
+            self.handler(batch)
+        except Exception as e:
+            with self.condition:
+                self.counters['failed'] += len(batch)
+            print(f'处理文件变更失败: {e}')
+        finally:
+            self.slots.release()
+
+    def stats(self):
+        with self.condition:
+            return dict(self.counters, pending=len(self.pending))
+
+    def stop(self):
+        """分发队列中剩余的事件并等待处理完成"""
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        self.dispatcher.join()
+        self.executor.shutdown(wait=True)
+
+
+def print_events(events):
+    """默认的事件处理函数: 打印合并后的事件"""
+    for event in events:
+        if event.kind == 'created':
+            print(f'有新的文件创建, {event.path}')
+        elif event.kind == 'modified':
+            print(f'文件被修改, {event.path}')
+        elif event.kind == 'moved':
+            print(f'文件被移动, {event.src_path} -> {event.path}')
+        else:
+            print(f'文件被删除, {event.path}')
 
 
 class ChangeHandler(PatternMatchingEventHandler):
 
+    def __init__(self, events, **kwargs):
+        super().__init__(**kwargs)
+        self.events = events
+
     def on_modified(self, event):
-        print(f'文件被修改, {event.src_path}')
+        # 目录的修改事件只是其中文件变化的副作用
+        if not event.is_directory:
+            self.events.put('modified', event.src_path)
 
     def on_created(self, event):
-        print(f'有新的文件创建, {event.src_path}')
+        self.events.put('created', event.src_path)
 
     def on_moved(self, event):
-        print(f'文件被删除, {event.src_path}')
+        self.events.put('moved', event.src_path, event.dest_path)
+
+    def on_deleted(self, event):
+        self.events.put('deleted', event.src_path)
 
-def monitor_directory(directory):
+def monitor_directory(directory, handler=print_events, debounce=0.5, workers=4, batch_size=100, patterns=None):
     """
     监听指定目录下面的文件变更
     :param directory: 目录名称
+    :param handler: 处理合并后事件的函数, 参数为 FileEvent 列表
+    :param debounce: 同一路径静止多少秒后才处理
+    :param workers: 处理线程数
+    :param batch_size: 每批最多的事件数
+    :param patterns: 只监听匹配的文件, 如 ['*.py']
     :return:
     """
+    events = CoalescingEventQueue(handler, debounce, workers, batch_size)
     observer = Observer()
-    handler = ChangeHandler()
-    observer.schedule(ChangeHandler(), directory, recursive=True)
+    observer.schedule(ChangeHandler(events, patterns=patterns), directory, recursive=True)
     observer.start()
 
     try:
@@ -91,11 +1209,15 @@ def monitor_directory(directory):
     except KeyboardInterrupt:
         observer.stop()
     observer.join()
-    # observer.stop()
+    events.stop()
+    stats = events.stats()
+    print(f'共收到 {stats["received"]} 个事件, 合并后分发 {stats["dispatched"]} 个({stats["batches"]} 批), '
+          f'抵消 {stats["cancelled"]} 个, 处理失败 {stats["failed"]} 个')
 # monitor_directory('./workspace')
+# monitor_directory('./workspace', debounce=1.0, patterns=['*.py', '*.md'])
 
 
-def qrcode_gen(url):
+def qrcode_gen(url, output_path='qrcode.png', show=True):
     import qrcode
     # 创建二维码实例
     qr = qrcode.QRCode(
@@ -112,22 +1234,378 @@ def qrcode_gen(url):
     img = qr.make_image(fill='black', back_color='white')
 
     # 保存二维码图片
-    img.save("qrcode.png")
+    img.save(output_path)
 
     # 或者直接展示二维码
-    img.show()
+    if show:
+        img.show()
 
 
-def image2_base64(file_path: str | bytes):
-    import base64
-    if isinstance(file_path, str):
-        with open(file_path, 'rb') as f:
-            image_data = f.read()
-            base64_data = base64.b64encode(image_data).decode('utf-8')
-            return base64_data
+# A4 纸 300dpi 的像素尺寸和页边距, 用于 PDF 排版
+PDF_PAGE_SIZE = (2480, 3508)
+PDF_MARGIN = 120
+# 每次追加写入 PDF 的页数
+PDF_PAGES_PER_WRITE = 20
+
+
+def _qr_matrix_task(key):
+    """
+    工作进程中计算二维码矩阵
+    :param key: (内容, 版本, 纠错等级 L/M/Q/H), 版本为 None 时自动选择最小版本
+    :return: (边长, 按 PIL '1' 模式打包的位数据)
+    """
+    import qrcode
+    from PIL import Image
+    payload, version, error_correction = key
+    qr = qrcode.QRCode(version=version, border=0,
+                       error_correction=getattr(qrcode.constants, f'ERROR_CORRECT_{error_correction}'))
+    qr.add_data(payload)
+    qr.make(fit=version is None)
+    matrix = qr.get_matrix()
+    size = len(matrix)
+    pixels = bytes(0 if cell else 255 for row in matrix for cell in row)
+    return size, Image.frombytes('L', (size, size), pixels).convert('1').tobytes()
+
+
+def _render_qr(matrix, box_size, border):
+    """把二维码矩阵放大成图片"""
+    from PIL import Image, ImageOps
+    size, bits = matrix
+    img = ImageOps.expand(Image.frombytes('1', (size, size), bits), border, fill=255)
+    return img.resize((img.width * box_size, img.height * box_size), Image.NEAREST)
+
+
+class QRMatrixCache:
+    """二维码矩阵缓存(sqlite), 以 (内容, 版本, 纠错等级) 为 key, 重复的内容不会重新计算"""
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.execute('CREATE TABLE IF NOT EXISTS matrices ('
+                        'payload TEXT, version INTEGER, error_correction TEXT, size INTEGER, bits BLOB, '
+                        'PRIMARY KEY (payload, version, error_correction))')
+
+    def get_many(self, keys):
+        found = {}
+        for payload, version, error_correction in keys:
+            # 自动版本以 0 保存
+            row = self.db.execute('SELECT size, bits FROM matrices WHERE payload = ? AND version = ? '
+                                  'AND error_correction = ?', (payload, version or 0, error_correction)).fetchone()
+            if row:
+                found[(payload, version, error_correction)] = row
+        return found
+
+    def put_many(self, matrices):
+        self.db.executemany('INSERT OR REPLACE INTO matrices VALUES (?, ?, ?, ?, ?)',
+                            ((payload, version or 0, error_correction) + matrix
+                             for (payload, version, error_correction), matrix in matrices.items()))
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+
+def _read_qr_payloads(payloads, column=0, name_column=None, header=None):
+    """
+    读取二维码内容, 并检查文件名
+    :param payloads: csv 文件路径, 或内容/(文件名, 内容) 的可迭代对象
+    :param column: csv 中内容所在的列(序号或表头名)
+    :param name_column: csv 中文件名所在的列, 为 None 时按行号命名
+    :param header: csv 第一行是否为表头, 为 None 时按列名判断: column 或 name_column 是表头名时才跳过第一行
+    :return: [(文件名, 内容)], 重复的文件名依次加上 _2、_3 ...
+    """
+    if isinstance(payloads, str):
+        import csv
+        if header is None:
+            header = isinstance(column, str) or isinstance(name_column, str)
+        with open(payloads, 'r', encoding='utf-8-sig', newline='') as f:
+            reader = csv.reader(f)
+            names = next(reader, []) if header else []
+            column = names.index(column) if isinstance(column, str) else column
+            name_index = names.index(name_column) if isinstance(name_column, str) else name_column
+            rows = [(row[name_index] if name_index is not None else None, row[column]) for row in reader if row]
     else:
-        base64_data = base64.b64encode(file_path).decode('utf-8')
-        return base64_data
+        rows = [item if isinstance(item, tuple) else (None, item) for item in payloads]
+
+    width = max(6, len(str(len(rows))))
+    items = []
+    # 按小写比较, 避免在不区分大小写的文件系统或 zip 中互相覆盖
+    taken = set()
+    for index, (name, payload) in enumerate(rows):
+        name = name or str(index).zfill(width)
+        if name in ('.', '..') or any(char in name for char in '/\\\0'):
+            raise ValueError(f'第 {index} 个二维码的文件名不能包含路径: {name!r}')
+        unique, number = name, 1
+        while unique.lower() in taken:
+            number += 1
+            unique = f'{name}_{number}'
+        taken.add(unique.lower())
+        items.append((unique, payload))
+    return items
+
+
+def _write_pdf_pages(output, pages, append):
+    pages[0].save(output, save_all=True, append_images=pages[1:], append=append, resolution=300)
+
+
+def qrcode_batch(payloads, output, column=0, name_column=None, version=None, error_correction='L',
+                 box_size=10, border=4, workers=None, cache_path=None, batch_size=1000, header=None):
+    """
+    批量生成二维码
+    二维码矩阵在进程池中计算, 相同 (内容, 版本, 纠错等级) 只计算一次; 图片在线程池中渲染和保存
+    :param payloads: csv 文件路径, 或内容/(文件名, 内容) 的可迭代对象
+    :param output: 输出目录; 以 .zip 结尾时打包成 zip, 以 .pdf 结尾时排版到 A4 页面
+    :param column: csv 中内容所在的列(序号或表头名)
+    :param name_column: csv 中文件名所在的列, 为 None 时按行号命名(000000.png, 000001.png ...), 重复的文件名依次加上 _2、_3 ...
+    :param version: 二维码版本 1-40, 为 None 时自动选择
+    :param error_correction: 纠错等级 L / M / Q / H
+    :param box_size: 每个小方格的像素大小
+    :param border: 边框的厚度(小方格数)
+    :param workers: 计算矩阵的进程数, 默认 CPU 核数
+    :param cache_path: 矩阵缓存(sqlite)路径, 多次运行之间复用
+    :param batch_size: 每批渲染的二维码数
+    :param header: csv 第一行是否为表头, 为 None 时只在按表头名指定列时跳过第一行
+    :return: 生成的二维码数量
+    """
+    items = _read_qr_payloads(payloads, column, name_column, header)
+    keys = list(dict.fromkeys((payload, version, error_correction) for _, payload in items))
+
+    start = time.perf_counter()
+    cache = QRMatrixCache(cache_path) if cache_path else None
+    matrices = cache.get_many(keys) if cache else {}
+    missing = [key for key in keys if key not in matrices]
+    if missing:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            computed = dict(zip(missing, executor.map(_qr_matrix_task, missing, chunksize=64)))
+        matrices.update(computed)
+        if cache:
+            cache.put_many(computed)
+    if cache:
+        cache.close()
+    print(f'共 {len(items)} 个二维码, 不同内容 {len(keys)} 个, 其中 {len(keys) - len(missing)} 个来自缓存')
+
+    def render(item):
+        name, payload = item
+        return name, _render_qr(matrices[(payload, version, error_correction)], box_size, border)
+
+    def save(item):
+        name, img = render(item)
+        img.save(os.path.join(output, f'{name}.png'))
+
+    kind = os.path.splitext(output)[1].lower()
+    archive = None
+    pages = []
+    page = None
+    pdf_started = False
+    slot = 0
+    if kind == '.zip':
+        import zipfile
+        archive = zipfile.ZipFile(output, 'w', zipfile.ZIP_STORED)
+    elif kind == '.pdf':
+        from PIL import Image
+        # 自动版本下各二维码边长可能不同, 按最大的二维码确定统一的格子大小, 小的居中放置
+        cell = max((matrices[key][0] + 2 * border) * box_size for key in keys) if keys else 0
+        columns = max(1, (PDF_PAGE_SIZE[0] - 2 * PDF_MARGIN) // cell) if cell else 1
+        rows = max(1, (PDF_PAGE_SIZE[1] - 2 * PDF_MARGIN) // cell) if cell else 1
+    else:
+        os.makedirs(output, exist_ok=True)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for batch_start in range(0, len(items), batch_size):
+            batch = items[batch_start:batch_start + batch_size]
+            if kind == '.zip':
+                for name, img in executor.map(render, batch):
+                    buffer = io.BytesIO()
+                    img.save(buffer, 'PNG')
+                    archive.writestr(f'{name}.png', buffer.getvalue())
+            elif kind == '.pdf':
+                for name, img in executor.map(render, batch):
+                    if page is None or slot >= columns * rows:
+                        page = Image.new('1', PDF_PAGE_SIZE, 255)
+                        pages.append(page)
+                        slot = 0
+                    offset = (cell - img.width) // 2
+                    page.paste(img, (PDF_MARGIN + slot % columns * cell + offset,
+                                     PDF_MARGIN + slot // columns * cell + offset))
+                    slot += 1
+                    if len(pages) > PDF_PAGES_PER_WRITE:
+                        # 已排满的页面追加写入 PDF, 内存中只保留少量页面
+                        _write_pdf_pages(output, pages[:-1], pdf_started)
+                        pdf_started = True
+                        pages = pages[-1:]
+            else:
+                list(executor.map(save, batch))
+            print(f'已生成 {min(batch_start + batch_size, len(items))}/{len(items)} 个二维码')
+
+    if archive is not None:
+        archive.close()
+    if pages:
+        _write_pdf_pages(output, pages, pdf_started)
+    elapsed = time.perf_counter() - start
+    print(f'二维码生成完成, 耗时 {elapsed:.1f} 秒, {len(items) / elapsed if elapsed else 0:.0f} 个/秒, 保存到 {output}')
+    return len(items)
+# qrcode_batch('./labels.csv', './qrcodes', column='url', name_column='sku')
+# qrcode_batch(['https://example.com/a', 'https://example.com/b'], './qrcodes.zip')
+# qrcode_batch('./labels.csv', './labels.pdf', column='url', error_correction='M', box_size=6, cache_path='./qr_cache.sqlite')
+
+
+# 常见图片格式的文件头, 用于生成 data URI 时判断 MIME 类型
+IMAGE_SIGNATURES = [
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'BM', 'image/bmp'),
+    (b'II*\x00', 'image/tiff'),
+    (b'MM\x00*', 'image/tiff'),
+    (b'\x00\x00\x01\x00', 'image/x-icon'),
+]
+
+
+def sniff_mime_type(header, file_path=None):
+    """
+    根据文件头判断 MIME 类型, 无法识别时按扩展名猜测
+    :param header: 文件开头的若干字节(至少 32 字节)
+    :param file_path: 文件路径, 用于按扩展名猜测
+    """
+    header = bytes(header)
+    for signature, mime_type in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return mime_type
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'image/webp'
+    if header[4:8] == b'ftyp':
+        brand = header[8:12]
+        if brand in (b'avif', b'avis'):
+            return 'image/avif'
+        if brand in (b'heic', b'heix', b'mif1'):
+            return 'image/heic'
+    if b'<svg' in header.lower() or header.lstrip().startswith(b'<?xml'):
+        return 'image/svg+xml'
+    if file_path:
+        import mimetypes
+        mime_type, _ = mimetypes.guess_type(file_path)
+        if mime_type:
+            return mime_type
+    return 'application/octet-stream'
+
+
+def iter_base64(source, chunk_size=3 * 256 * 1024, use_mmap=False, data_uri=False):
+    """
+    流式 base64 编码, 按块产出编码后的字节, 内存占用只与 chunk_size 相关
+    :param source: 文件路径(str 或 os.PathLike)或 bytes 等支持缓冲区协议的对象
+    :param chunk_size: 每次读取的字节数, 会向下取整为 3 的倍数, 保证只有最后一块带填充
+    :param use_mmap: 使用内存映射读取文件
+    :param data_uri: 先输出 data:<MIME>;base64, 前缀
+    """
+    import base64
+    import mmap
+    chunk_size = max(3, chunk_size - chunk_size % 3)
+
+    if not isinstance(source, (str, os.PathLike)):
+        data = memoryview(source)
+        if data_uri:
+            yield f'data:{sniff_mime_type(data[:64])};base64,'.encode('ascii')
+        for start in range(0, len(data), chunk_size):
+            yield base64.b64encode(data[start:start + chunk_size])
+        return
+
+    with open(source, 'rb') as f:
+        if data_uri:
+            yield f'data:{sniff_mime_type(f.read(64), source)};base64,'.encode('ascii')
+            f.seek(0)
+        if use_mmap and os.fstat(f.fileno()).st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for start in range(0, len(mapped), chunk_size):
+                    yield base64.b64encode(mapped[start:start + chunk_size])
+        else:
+            while chunk := f.read(chunk_size):
+                yield base64.b64encode(chunk)
+
+
+def write_base64(source, output, chunk_size=3 * 256 * 1024, use_mmap=False, data_uri=False):
+    """
+    把 base64 编码结果逐块写到文件、文件对象或 socket
+    :param source: 文件路径(str 或 os.PathLike)或 bytes
+    :param output: 输出文件路径, 或有 write(二进制)/sendall 方法的对象
+    :return: 写出的字节数
+    """
+    chunks = iter_base64(source, chunk_size, use_mmap, data_uri)
+    written = 0
+    if isinstance(output, (str, os.PathLike)):
+        with open(output, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                written += len(chunk)
+        return written
+
+    send = output.sendall if hasattr(output, 'sendall') else output.write
+    for chunk in chunks:
+        send(chunk)
+        written += len(chunk)
+    return written
+
+
+def image2_base64(file_path: str | os.PathLike | bytes, data_uri=False):
+    """
+    图片转 base64 字符串
+    :param file_path: 文件路径或 bytes
+    :param data_uri: 返回 data:<MIME>;base64,... 形式
+    """
+    return b''.join(iter_base64(file_path, data_uri=data_uri)).decode('utf-8')
+
+
+def _base64_task(file_path, output_path, data_uri, use_mmap):
+    """工作进程中编码一个文件, 返回 (输入字节数, 输出字节数)"""
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    return os.path.getsize(file_path), write_base64(file_path, output_path, use_mmap=use_mmap, data_uri=data_uri)
+
+
+def images2_base64(directory, output_dir, extensions=('.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp', '.svg'),
+                   workers=None, data_uri=False, use_mmap=True):
+    """
+    多进程批量把目录下的图片编码为 base64 文件(原文件名 + .b64), 输出目录与输入目录结构一致
+    :param directory: 图片目录
+    :param output_dir: 输出目录
+    :param extensions: 需要编码的扩展名
+    :param workers: 进程数, 默认 CPU 核数
+    :param data_uri: 输出 data URI 形式
+    :param use_mmap: 使用内存映射读取文件
+    :return: 成功编码的文件数
+    """
+    tasks = []
+    for root, _, filenames in os.walk(directory):
+        for filename in filenames:
+            if filename.lower().endswith(extensions):
+                file_path = os.path.join(root, filename)
+                output_path = os.path.join(output_dir, os.path.relpath(file_path, directory) + '.b64')
+                tasks.append((file_path, output_path))
+
+    start = time.perf_counter()
+    input_bytes = output_bytes = 0
+    encoded = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_base64_task, file_path, output_path, data_uri, use_mmap): file_path
+                   for file_path, output_path in tasks}
+        for future in as_completed(futures):
+            try:
+                size, written = future.result()
+            except BrokenProcessPool:
+                raise
+            except Exception as e:
+                # 单个文件失败(读写错误、mmap 失败、结果无法传回等)不影响其他文件
+                print(f'编码失败 {futures[future]}: {e!r}')
+                continue
+            input_bytes += size
+            output_bytes += written
+            encoded += 1
+
+    elapsed = time.perf_counter() - start
+    print(f'已编码 {encoded}/{len(tasks)} 个文件, {input_bytes / 1024 / 1024:.1f} MB -> {output_bytes / 1024 / 1024:.1f} MB, '
+          f'{input_bytes / 1024 / 1024 / elapsed if elapsed else 0:.1f} MB/秒')
+    return encoded
+# image2_base64('./logo.png', data_uri=True)
+# write_base64('./large.tiff', './large.tiff.b64', use_mmap=True)
+# images2_base64('./images', './images_base64', data_uri=True)
 
 
 # 按装订区域中的绿色按钮以运行脚本。
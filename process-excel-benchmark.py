@@ -0,0 +1,153 @@
+
+"""  process_excel 基准测试脚本: 对比 pandas 读写与流式读写的吞吐  """
+
+import os
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import platform
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from openpyxl import Workbook
+
+from main import process_excel
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，无法统计峰值内存
+    resource = None
+
+# 基准测试模式：传给 process_excel 的参数，output 为输出文件扩展名
+BENCH_MODES = {
+    'pandas-xlsx': {'output': '.xlsx'},
+    'streaming-xlsx': {'output': '.xlsx', 'streaming': True},
+    'streaming-csv': {'output': '.csv', 'streaming': True},
+    'streaming-parquet': {'output': '.parquet', 'streaming': True},
+    'streaming-usecols': {'output': '.csv', 'streaming': True, 'usecols': ['Original_Column']},
+}
+
+
+def generate_workbook(path, rows=100_000, extra_columns=8, seed=42):
+    """
+    生成确定性的测试工作簿：Original_Column + 若干干扰列
+    约 1% 的行 Original_Column 为空，空值只出现在所有模式都会读取的列中，保证 usecols 模式丢弃的行与其他模式相同
+    """
+    rng = random.Random(seed)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(['Original_Column'] + [f'Column_{index}' for index in range(extra_columns)])
+    regions = ['north', 'south', 'east', 'west']
+    for _ in range(rows):
+        row = [None if rng.random() < 0.01 else rng.randint(0, 10_000)]
+        for index in range(extra_columns):
+            if index % 2:
+                row.append(rng.choice(regions))
+            else:
+                row.append(round(rng.random() * 1000, 2))
+        sheet.append(row)
+    workbook.save(path)
+    print(f"已生成 {rows} 行测试工作簿: {path}", file=sys.stderr)
+
+
+def _measure(workbook, output_path, options):
+    """
+    运行一次 process_excel（在独立的 spawn 子进程中执行，峰值内存只反映这一个模式）
+    :return: 耗时、输出行数、输出大小和峰值常驻内存（MB，Linux 下 ru_maxrss 单位为 KB，macOS 为字节）
+    """
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        rows = process_excel(workbook, output_path=output_path, **options)
+    elapsed = time.perf_counter() - start
+
+    peak_rss_mb = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak_rss_mb = peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    return {
+        'seconds': round(elapsed, 4),
+        'rows': rows,
+        'rows_per_sec': round(rows / elapsed, 2) if elapsed else None,
+        'output_bytes': os.path.getsize(output_path),
+        'peak_rss_mb': peak_rss_mb,
+    }
+
+
+def run_benchmark(workbook, modes):
+    """依次运行各个模式，返回完整的基准测试报告"""
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'workbook': {'path': str(workbook), 'bytes': os.path.getsize(workbook)},
+        'runs': [],
+    }
+
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory(prefix='process-excel-bench-') as work_dir:
+        for mode in modes:
+            options = dict(BENCH_MODES[mode])
+            output_path = os.path.join(work_dir, mode + options.pop('output'))
+            print(f"运行模式: {mode}", file=sys.stderr)
+            # 每个模式使用新的工作进程，避免上一个模式的内存峰值计入下一个
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                result = pool.submit(_measure, str(workbook), output_path, options).result()
+            report['runs'].append({'mode': mode, 'options': BENCH_MODES[mode], **result})
+
+    baseline = next((run for run in report['runs'] if run['mode'] == 'pandas-xlsx'), None)
+    if baseline:
+        for run in report['runs']:
+            run['speedup'] = round(baseline['seconds'] / run['seconds'], 2) if run['seconds'] else None
+    # 各模式应输出相同的行数，不一致时（如自带工作簿的其他列含空值，usecols 模式不会因此丢行）提示，吞吐不可直接比较
+    if len({run['rows'] for run in report['runs']}) > 1:
+        print("警告: 各模式输出的行数不一致，见报告中的 rows", file=sys.stderr)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="process_excel 基准测试")
+    parser.add_argument("--workbook", help="测试工作簿（不存在时自动生成；默认使用临时文件）")
+    parser.add_argument("--rows", type=int, default=100_000, help="生成的数据行数（默认 100000）")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子（默认 42）")
+    parser.add_argument("--modes", default=','.join(BENCH_MODES),
+                        help=f"逗号分隔的测试模式，可选: {', '.join(BENCH_MODES)}")
+    parser.add_argument("--output", "-o", help="JSON 报告输出文件（默认输出到标准输出）")
+    args = parser.parse_args()
+
+    modes = [mode.strip() for mode in args.modes.split(',') if mode.strip()]
+    unknown = [mode for mode in modes if mode not in BENCH_MODES]
+    if unknown:
+        parser.error(f"未知的测试模式: {', '.join(unknown)}")
+
+    with contextlib.ExitStack() as stack:
+        if args.workbook:
+            workbook = Path(args.workbook)
+            if not workbook.exists():
+                generate_workbook(workbook, args.rows, seed=args.seed)
+        else:
+            work_dir = stack.enter_context(tempfile.TemporaryDirectory(prefix='excel-corpus-'))
+            workbook = Path(work_dir) / 'bench.xlsx'
+            generate_workbook(workbook, args.rows, seed=args.seed)
+
+        report = run_benchmark(workbook, modes)
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(output, encoding='utf-8')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+#  pip install pandas openpyxl pyarrow watchdog
+#  eg: python .\process-excel-benchmark.py --rows 500000 --output bench.json
+#  eg: python .\process-excel-benchmark.py --workbook E:\sale_data.xlsx --modes pandas-xlsx,streaming-csv
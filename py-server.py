@@ -1,12 +1,111 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox
+import io
 import os
+import time
+import shutil
 import threading
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
 import webbrowser
 import socket
 
 
+class ServerStats:
+    """线程安全的请求数、发送字节数和连接数统计"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes_sent = 0
+        self.connections = 0
+        self.rejected = 0
+
+    def add(self, requests=0, bytes_sent=0, connections=0, rejected=0):
+        with self.lock:
+            self.requests += requests
+            self.bytes_sent += bytes_sent
+            self.connections += connections
+            self.rejected += rejected
+
+    def snapshot(self):
+        with self.lock:
+            return self.requests, self.bytes_sent, self.connections, self.rejected
+
+
+class FileRequestHandler(SimpleHTTPRequestHandler):
+    """
+    支持 HTTP/1.1 keep-alive 的静态文件处理器
+    文件内容通过 socket.sendfile 发送, 支持的平台上使用 os.sendfile 零拷贝
+    """
+    protocol_version = "HTTP/1.1"
+    # keep-alive 连接空闲超时(秒), 避免空闲连接一直占用线程和连接数
+    timeout = 30
+
+    def __init__(self, *args, stats=None, **kwargs):
+        self.stats = stats
+        super().__init__(*args, **kwargs)
+
+    def log_request(self, code='-', size='-'):
+        if self.stats:
+            self.stats.add(requests=1)
+        super().log_request(code, size)
+
+    def copyfile(self, source, outputfile):
+        self.wfile.flush()
+        try:
+            source.fileno()
+        except (AttributeError, io.UnsupportedOperation):
+            # 目录列表等内存中的内容没有文件描述符, 分块复制; 传输中的 socket 错误直接抛出
+            start = source.tell()
+            shutil.copyfileobj(source, outputfile)
+            sent = source.tell() - start
+        else:
+            sent = self.connection.sendfile(source)
+        if self.stats:
+            self.stats.add(bytes_sent=sent)
+
+
+class LimitedThreadingHTTPServer(ThreadingHTTPServer):
+    """每个连接一个线程的 HTTP 服务器, 超过最大连接数时直接返回 503"""
+
+    def __init__(self, server_address, handler_class, max_connections=64, stats=None):
+        super().__init__(server_address, handler_class)
+        self.connection_slots = threading.BoundedSemaphore(max_connections)
+        self.stats = stats
+
+    def process_request(self, request, client_address):
+        if not self.connection_slots.acquire(blocking=False):
+            try:
+                request.sendall(b"HTTP/1.1 503 Service Unavailable\r\nRetry-After: 1\r\n"
+                                b"Content-Length: 0\r\nConnection: close\r\n\r\n")
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            if self.stats:
+                self.stats.add(rejected=1)
+            return
+        if self.stats:
+            self.stats.add(connections=1)
+        super().process_request(request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self.connection_slots.release()
+            if self.stats:
+                self.stats.add(connections=-1)
+
+
+def format_bytes(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
 class HTTPServerGUI:
     def __init__(self, root):
         self.root = root
@@ -16,6 +115,8 @@ class HTTPServerGUI:
         self.server_thread = None
         self.httpd = None
         self.server_running = False
+        self.stats = None
+        self.last_sample = None
 
         # 端口号输入
         self.port_label = tk.Label(root, text="端口号:")
@@ -25,6 +126,14 @@ class HTTPServerGUI:
         self.port_entry.pack()
         self.port_entry.insert(0, "8000")  # 默认端口
 
+        # 最大连接数
+        self.connections_label = tk.Label(root, text="最大连接数:")
+        self.connections_label.pack(pady=(20, 5))
+
+        self.connections_entry = tk.Entry(root)
+        self.connections_entry.pack()
+        self.connections_entry.insert(0, "64")
+
         # 目录选择
         self.dir_label = tk.Label(root, text="服务目录:")
         self.dir_label.pack(pady=(20, 5))
@@ -46,6 +155,10 @@ class HTTPServerGUI:
         self.status_label = tk.Label(root, text="服务器状态: 未运行", fg="red")
         self.status_label.pack(pady=10)
 
+        # 实时吞吐
+        self.stats_label = tk.Label(root, text="")
+        self.stats_label.pack()
+
     def browse_directory(self):
         directory = filedialog.askdirectory()
         if directory:
@@ -65,6 +178,12 @@ class HTTPServerGUI:
             messagebox.showerror("错误", "端口号必须在1-65535之间")
             return
 
+        max_connections = self.connections_entry.get()
+        if not max_connections.isdigit() or int(max_connections) < 1:
+            messagebox.showerror("错误", "请输入有效的最大连接数")
+            return
+        max_connections = int(max_connections)
+
         if not directory or not os.path.isdir(directory):
             messagebox.showerror("错误", "请选择有效的目录")
             return
@@ -75,9 +194,10 @@ class HTTPServerGUI:
             return
 
         # 在后台线程中启动服务器
+        self.stats = ServerStats()
         self.server_thread = threading.Thread(
             target=self.run_server,
-            args=(directory, port),
+            args=(directory, port, max_connections),
             daemon=True
         )
         self.server_thread.start()
@@ -85,7 +205,9 @@ class HTTPServerGUI:
         self.server_running = True
         self.start_button.config(state=tk.DISABLED)
         self.stop_button.config(state=tk.NORMAL)
-        self.status_label.config(text=f"服务器状态: 运行中 (端口: {port})", fg="green")
+        self.status_label.config(text=f"服务器状态: 运行中 (端口: {port}, 最大连接数: {max_connections})", fg="green")
+        self.last_sample = (time.monotonic(), 0, 0)
+        self.root.after(1000, self.update_stats)
 
         # 在默认浏览器中打开
         webbrowser.open(f"http://localhost:{port}")
@@ -98,10 +220,9 @@ class HTTPServerGUI:
             except socket.error:
                 return False
 
-    def run_server(self, directory, port):
-        os.chdir(directory)
-        handler = SimpleHTTPRequestHandler
-        self.httpd = HTTPServer(('', port), handler)
+    def run_server(self, directory, port, max_connections):
+        handler = partial(FileRequestHandler, directory=directory, stats=self.stats)
+        self.httpd = LimitedThreadingHTTPServer(('', port), handler, max_connections, self.stats)
 
         try:
             self.httpd.serve_forever()
@@ -128,6 +249,20 @@ class HTTPServerGUI:
             self.httpd = None
             self.root.after(100, self.update_ui_stopped)
 
+    def update_stats(self):
+        """每秒刷新一次请求数/秒和字节数/秒"""
+        if not self.server_running or self.stats is None:
+            return
+        now = time.monotonic()
+        requests, bytes_sent, connections, rejected = self.stats.snapshot()
+        last_time, last_requests, last_bytes = self.last_sample
+        elapsed = now - last_time
+        self.last_sample = (now, requests, bytes_sent)
+        self.stats_label.config(
+            text=f"{(requests - last_requests) / elapsed:.1f} 请求/秒, {format_bytes((bytes_sent - last_bytes) / elapsed)}/秒, "
+                 f"当前连接 {connections}, 累计 {requests} 个请求 / {format_bytes(bytes_sent)}, 拒绝 {rejected} 个连接")
+        self.root.after(1000, self.update_stats)
+
     def update_ui_stopped(self):
         self.start_button.config(state=tk.NORMAL)
         self.stop_button.config(state=tk.DISABLED)
@@ -1,7 +1,13 @@
 import os
+import io
+import json
+import time
+import shutil
 import zipfile
 import argparse
+import threading
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import logging
 from typing import List
 
@@ -9,11 +15,163 @@ from typing import List
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 流式解压时每次拷贝的缓冲区大小
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# 解压后总大小超过该值的压缩包按成员并行解压
+LARGE_ARCHIVE_BYTES = 64 * 1024 * 1024
+
+# 嵌套模式下不超过该大小的内层压缩包直接在内存中解压
+NESTED_IN_MEMORY_BYTES = 32 * 1024 * 1024
+
+# 小于该大小的成员不检查压缩比（小文件的压缩比没有意义）
+RATIO_CHECK_MIN_BYTES = 1024 * 1024
+
+
+class ArchiveLimitError(Exception):
+    """压缩包超出安全限制（疑似 zip 炸弹或包含路径穿越）"""
+
+
+class ExtractionLimits:
+    """
+    单个压缩包的解压安全限制
+
+    Args:
+        max_total_bytes: 解压后总字节数上限
+        max_ratio: 压缩比上限（解压后大小 / 压缩后大小）
+        max_entries: 成员数量上限
+        max_depth: 成员路径的目录层级上限
+        max_seconds: 单个压缩包解压耗时上限（None 表示不限制）
+    """
+
+    def __init__(self, max_total_bytes: int = 64 * 1024 ** 3, max_ratio: float = 200,
+                 max_entries: int = 1_000_000, max_depth: int = 64, max_seconds: float = None):
+        self.max_total_bytes = max_total_bytes
+        self.max_ratio = max_ratio
+        self.max_entries = max_entries
+        self.max_depth = max_depth
+        self.max_seconds = max_seconds
+
+
+class _ExtractionBudget:
+    """单个压缩包解压过程中的字节和时间预算，多个线程共享"""
+
+    def __init__(self, limits: ExtractionLimits):
+        self.limits = limits
+        self.used = 0
+        self.start_time = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, size: int):
+        """累加已解压字节数，超出限制时抛出 ArchiveLimitError 中止解压"""
+        with self._lock:
+            self.used += size
+            used = self.used
+        if used > self.limits.max_total_bytes:
+            raise ArchiveLimitError(f"解压数据量超过上限 {self.limits.max_total_bytes} 字节")
+        if self.limits.max_seconds and time.monotonic() - self.start_time > self.limits.max_seconds:
+            raise ArchiveLimitError(f"解压耗时超过上限 {self.limits.max_seconds} 秒")
+
+
+def _preallocate(file_obj, size: int):
+    """预分配输出文件空间，减少文件系统碎片和扩容开销"""
+    if size <= 0:
+        return
+    if hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(file_obj.fileno(), 0, size)
+        except OSError:
+            pass  # 部分文件系统不支持，忽略
+
+
+def _fsync_dir(path: Path):
+    """把目录中新建、删除的目录项刷到磁盘（Windows 不支持对目录 fsync，跳过）"""
+    if os.name == 'nt':
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _fsync_tree(root: Path):
+    """刷新 root 下所有目录以及 root 在父目录中的目录项，确保解压出的文件在断电后仍然存在"""
+    for directory, _, _ in os.walk(root):
+        _fsync_dir(Path(directory))
+    _fsync_dir(root.parent)
+
+
+class ExtractionJournal:
+    """
+    解压日志，用于中断后继续解压
+
+    每个成员完整写入、fsync 并通过大小和 CRC 校验后追加一行 JSON: [size, crc, 成员名]，
+    重新运行时跳过日志中已完成的成员。预分配后文件大小一开始就等于声明大小，
+    所以只有日志能证明数据已经落盘，日志本身每次记录后也会 fsync
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.completed = {}
+        self._lock = threading.Lock()
+
+        if path.exists():
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        size, crc, name = json.loads(line)
+                    except ValueError:
+                        continue  # 崩溃时只写了一半的行
+                    self.completed[name] = (size, crc)
+
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def is_done(self, info: zipfile.ZipInfo) -> bool:
+        """成员是否已在日志中记录为完成"""
+        return self.completed.get(info.filename) == (info.file_size, info.CRC)
+
+    def record(self, info: zipfile.ZipInfo):
+        """记录一个已完成的成员，立即刷新到磁盘"""
+        with self._lock:
+            self._file.write(json.dumps([info.file_size, info.CRC, info.filename], ensure_ascii=False) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.completed[info.filename] = (info.file_size, info.CRC)
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def remove(self):
+        """解压全部完成后删除日志"""
+        self.close()
+        self.path.unlink(missing_ok=True)
+
 
 class ZipExtractor:
-    def __init__(self, base_dir: str):
+    def __init__(self, base_dir: str, workers: int = 1, member_workers: int = 1,
+                 limits: ExtractionLimits = None, nested: bool = False, nested_depth: int = 5):
+        """
+        Args:
+            base_dir: 要处理的目录
+            workers: 同时解压的压缩包数量
+            member_workers: 大压缩包内并行解压成员的线程数
+            limits: 解压安全限制（None 使用默认限制）
+            nested: 是否在解压过程中继续解压内层压缩包
+            nested_depth: 内层压缩包的最大嵌套层数
+        """
         self.base_dir = Path(base_dir)
         self.supported_extensions = ['.zip']
+        self.workers = max(1, workers)
+        self.member_workers = max(1, member_workers)
+        self.limits = limits or ExtractionLimits()
+        self.nested = nested
+        self.nested_depth = nested_depth
+
+        # 解压吞吐统计（多线程累加）
+        self._stats_lock = threading.Lock()
+        self.bytes_written = 0
 
     def find_zip_files(self) -> List[Path]:
         """查找所有ZIP文件"""
@@ -22,6 +180,289 @@ class ZipExtractor:
             zip_files.extend(self.base_dir.glob(f"*{ext}"))
         return zip_files
 
+    @staticmethod
+    def _member_target(extract_to: Path, info: zipfile.ZipInfo):
+        """
+        计算成员的输出路径，与 ZipFile.extractall 一致地去掉盘符、绝对路径和 .. 等路径段
+
+        Returns:
+            Path: 输出路径；成员名清理后为空时返回 None
+        """
+        arcname = info.filename.replace('/', os.path.sep)
+        if os.path.altsep:
+            arcname = arcname.replace(os.path.altsep, os.path.sep)
+        arcname = os.path.splitdrive(arcname)[1]
+        invalid_parts = ('', os.path.curdir, os.path.pardir)
+        arcname = os.path.sep.join(part for part in arcname.split(os.path.sep) if part not in invalid_parts)
+        if not arcname:
+            return None
+        return extract_to / arcname
+
+    @staticmethod
+    def _is_unsafe_name(filename: str) -> bool:
+        """成员名是否为绝对路径、带盘符或包含 .. 路径段"""
+        name = filename.replace('\\', '/')
+        if name.startswith('/') or (len(name) > 1 and name[1] == ':'):
+            return True
+        return '..' in name.split('/')
+
+    def _prescan(self, infos: List[zipfile.ZipInfo], extract_to: Path):
+        """
+        解压前检查中央目录：成员数量、总大小、压缩比、路径层级、路径穿越以及磁盘剩余空间
+
+        Raises:
+            ArchiveLimitError: 超出任一限制
+        """
+        limits = self.limits
+        if len(infos) > limits.max_entries:
+            raise ArchiveLimitError(f"成员数量 {len(infos)} 超过上限 {limits.max_entries}")
+
+        total_size = 0
+        compressed_size = 0
+        for info in infos:
+            if self._is_unsafe_name(info.filename):
+                raise ArchiveLimitError(f"成员路径不安全: {info.filename}")
+
+            depth = len([part for part in info.filename.replace('\\', '/').split('/') if part])
+            if depth > limits.max_depth:
+                raise ArchiveLimitError(f"成员路径层级 {depth} 超过上限 {limits.max_depth}: {info.filename}")
+
+            if (info.file_size >= RATIO_CHECK_MIN_BYTES and
+                    info.file_size > limits.max_ratio * max(info.compress_size, 1)):
+                raise ArchiveLimitError(f"成员压缩比超过上限 {limits.max_ratio}: {info.filename}")
+
+            total_size += info.file_size
+            compressed_size += info.compress_size
+
+        if total_size > limits.max_total_bytes:
+            raise ArchiveLimitError(f"解压后总大小 {total_size} 字节超过上限 {limits.max_total_bytes}")
+        if total_size >= RATIO_CHECK_MIN_BYTES and total_size > limits.max_ratio * max(compressed_size, 1):
+            raise ArchiveLimitError(f"整体压缩比超过上限 {limits.max_ratio}")
+
+        # 解压目录在检查通过后才创建，按最近的已存在上级目录统计剩余空间
+        existing = extract_to
+        while not existing.exists() and existing.parent != existing:
+            existing = existing.parent
+        free_space = shutil.disk_usage(existing).free
+        if total_size > free_space:
+            raise ArchiveLimitError(f"磁盘剩余空间不足: 需要 {total_size} 字节, 剩余 {free_space} 字节")
+
+    @staticmethod
+    def _journal_path(zip_file: Path, extract_to: Path) -> Path:
+        """解压日志路径，放在解压目录中"""
+        return extract_to / f".{zip_file.name}.journal"
+
+    def _extract_member(self, zip_ref: zipfile.ZipFile, info: zipfile.ZipInfo, extract_to: Path,
+                        journal: ExtractionJournal = None, budget: _ExtractionBudget = None) -> int:
+        """
+        以流的方式解压单个成员（大缓冲区拷贝 + 预分配输出文件）
+
+        Returns:
+            int: 写入的字节数（日志中已完成而跳过的成员为 0）
+        """
+        target = self._member_target(extract_to, info)
+        if target is None:
+            return 0
+        if info.is_dir():
+            target.mkdir(parents=True, exist_ok=True)
+            return 0
+
+        # 上次已完整写入的成员直接跳过
+        if journal and journal.is_done(info) and target.is_file() and target.stat().st_size == info.file_size:
+            return 0
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            with zip_ref.open(info) as src, open(target, 'wb') as dst:
+                _preallocate(dst, info.file_size)
+                # 读到末尾时 ZipExtFile 会校验 CRC，不匹配则抛出 BadZipFile
+                written = 0
+                while chunk := src.read(COPY_BUFFER_SIZE):
+                    written += len(chunk)
+                    # 实际数据超过中央目录声明的大小，说明头信息被伪造
+                    if written > info.file_size:
+                        raise ArchiveLimitError(f"成员实际大小超过声明大小: {info.filename}")
+                    if budget:
+                        budget.consume(len(chunk))
+                    dst.write(chunk)
+                if written != info.file_size:
+                    raise zipfile.BadZipFile(f"成员大小不一致: {info.filename}")
+                # 数据落盘后才能写入日志，否则断电后日志会认可一个预分配但未写满的文件
+                dst.flush()
+                os.fsync(dst.fileno())
+        except BaseException:
+            # 删除写了一半的文件
+            target.unlink(missing_ok=True)
+            raise
+
+        if journal:
+            journal.record(info)
+        with self._stats_lock:
+            self.bytes_written += info.file_size
+        return info.file_size
+
+    def _is_nested_archive(self, info: zipfile.ZipInfo, depth: int) -> bool:
+        """嵌套模式下，成员是否为需要继续解压的内层压缩包"""
+        return (self.nested and depth < self.nested_depth and
+                any(info.filename.lower().endswith(ext) for ext in self.supported_extensions))
+
+    def _verify_complete(self, file_infos: List[zipfile.ZipInfo], extract_to: Path,
+                         journal: ExtractionJournal, depth: int = 0) -> bool:
+        """确认所有成员都已在日志中记录完成，且磁盘上的文件大小一致（内层压缩包只检查日志）"""
+        for info in file_infos:
+            target = self._member_target(extract_to, info)
+            if target is None:
+                continue
+            if not journal.is_done(info):
+                return False
+            if self._is_nested_archive(info, depth):
+                continue
+            try:
+                if target.stat().st_size != info.file_size:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    @staticmethod
+    def _read_member(zip_ref: zipfile.ZipFile, info: zipfile.ZipInfo, budget: _ExtractionBudget) -> bytes:
+        """把成员完整读入内存（用于小的内层压缩包），同样受大小和预算限制"""
+        with zip_ref.open(info) as src:
+            data = src.read(info.file_size + 1)
+        if len(data) > info.file_size:
+            raise ArchiveLimitError(f"成员实际大小超过声明大小: {info.filename}")
+        budget.consume(len(data))
+        return data
+
+    def _extract_nested(self, zip_ref: zipfile.ZipFile, info: zipfile.ZipInfo, extract_to: Path,
+                        journal: ExtractionJournal, budget: _ExtractionBudget, depth: int) -> int:
+        """
+        解压内层压缩包到同名目录
+
+        小的内层压缩包直接在内存中打开，不落盘；大的先写到磁盘，解压完成后删除
+        """
+        target = self._member_target(extract_to, info)
+        if target is None or (journal and journal.is_done(info)):
+            return 0
+        inner_dir = target.parent / target.stem
+
+        if info.file_size <= NESTED_IN_MEMORY_BYTES:
+            data = self._read_member(zip_ref, info, budget)
+            with zipfile.ZipFile(io.BytesIO(data), 'r') as inner_ref:
+                infos = inner_ref.infolist()
+                logger.info(f"解压内层压缩包 {info.filename} (内存, 包含 {len(infos)} 个文件) -> {inner_dir}")
+                self._prescan(infos, inner_dir)
+                inner_dir.mkdir(parents=True, exist_ok=True)
+                self._extract_archive(inner_ref, None, infos, inner_dir, None, budget, depth + 1)
+        else:
+            self._extract_member(zip_ref, info, extract_to, None, budget)
+            if not self._extract_file(target, inner_dir, depth + 1, budget):
+                raise zipfile.BadZipFile(f"内层压缩包解压校验未通过: {info.filename}")
+            target.unlink()
+
+        # 内层压缩包的文件和目录项落盘后才记录完成
+        _fsync_tree(inner_dir)
+        if journal:
+            journal.record(info)
+        return info.file_size
+
+    def _handle_member(self, zip_ref: zipfile.ZipFile, info: zipfile.ZipInfo, extract_to: Path,
+                       journal: ExtractionJournal, budget: _ExtractionBudget, depth: int) -> int:
+        """解压单个文件成员，嵌套模式下内层压缩包立即继续解压"""
+        if self._is_nested_archive(info, depth):
+            return self._extract_nested(zip_ref, info, extract_to, journal, budget, depth)
+        return self._extract_member(zip_ref, info, extract_to, journal, budget)
+
+    def _extract_members_parallel(self, zip_file: Path, infos: List[zipfile.ZipInfo], extract_to: Path,
+                                  journal: ExtractionJournal, budget: _ExtractionBudget, depth: int):
+        """使用线程池并行解压成员，每个线程持有独立的 ZipFile 句柄（zlib 解压会释放 GIL）"""
+        local = threading.local()
+        handles = []
+        handles_lock = threading.Lock()
+
+        def extract(info):
+            if not hasattr(local, 'zip_ref'):
+                local.zip_ref = zipfile.ZipFile(zip_file, 'r')
+                with handles_lock:
+                    handles.append(local.zip_ref)
+            return self._handle_member(local.zip_ref, info, extract_to, journal, budget, depth)
+
+        # 大文件优先提交，避免最后剩下一个大成员单线程收尾
+        infos = sorted(infos, key=lambda info: info.file_size, reverse=True)
+        try:
+            with ThreadPoolExecutor(max_workers=self.member_workers) as executor:
+                for _ in executor.map(extract, infos):
+                    pass
+        finally:
+            for handle in handles:
+                handle.close()
+
+    def _extract_archive(self, zip_ref: zipfile.ZipFile, zip_file: Path, infos: List[zipfile.ZipInfo],
+                         extract_to: Path, journal: ExtractionJournal, budget: _ExtractionBudget,
+                         depth: int) -> List[zipfile.ZipInfo]:
+        """
+        解压已打开的压缩包中的所有成员
+
+        Args:
+            zip_file: 压缩包在磁盘上的路径，内存中的压缩包为 None（不做成员级并行）
+
+        Returns:
+            List[ZipInfo]: 文件成员列表（不含目录）
+        """
+        # 先创建目录，再流式解压文件
+        file_infos = []
+        for info in infos:
+            if info.is_dir():
+                self._extract_member(zip_ref, info, extract_to)
+            else:
+                file_infos.append(info)
+
+        total_size = sum(info.file_size for info in file_infos)
+        if (zip_file is not None and self.member_workers > 1 and len(file_infos) > 1 and
+                total_size >= LARGE_ARCHIVE_BYTES):
+            self._extract_members_parallel(zip_file, file_infos, extract_to, journal, budget, depth)
+        else:
+            for info in file_infos:
+                self._handle_member(zip_ref, info, extract_to, journal, budget, depth)
+        return file_infos
+
+    def _extract_file(self, zip_file: Path, extract_to: Path, depth: int = 0,
+                      budget: _ExtractionBudget = None) -> bool:
+        """
+        解压磁盘上的压缩包（带解压日志）
+
+        Returns:
+            bool: 日志是否确认全部成员都已校验完成
+        """
+        journal = None
+        try:
+            with zipfile.ZipFile(zip_file, 'r') as zip_ref:
+                # 检查文件数量
+                infos = zip_ref.infolist()
+                logger.info(f"解压 {zip_file.name} (包含 {len(infos)} 个文件) -> {extract_to.name}")
+
+                # 解压前检查中央目录，解压中再按实际字节数和耗时限制（内层压缩包共用外层预算）
+                # 检查通过后才创建解压目录，被拒绝的压缩包不会留下空目录
+                self._prescan(infos, extract_to)
+                budget = budget or _ExtractionBudget(self.limits)
+                extract_to.mkdir(parents=True, exist_ok=True)
+
+                # 解压日志：中断后重新运行时跳过已完成的成员
+                journal = ExtractionJournal(self._journal_path(zip_file, extract_to))
+                if journal.completed:
+                    logger.info(f"继续上次未完成的解压: {zip_file.name} (已完成 {len(journal.completed)} 个文件)")
+
+                file_infos = self._extract_archive(zip_ref, zip_file, infos, extract_to, journal, budget, depth)
+
+            if not self._verify_complete(file_infos, extract_to, journal, depth):
+                return False
+
+            journal.remove()
+            return True
+        finally:
+            if journal:
+                journal.close()
+
     def extract_zip(self, zip_file: Path, extract_to: Path = None, delete_original: bool = True) -> bool:
         """
         解压单个ZIP文件
@@ -43,25 +484,22 @@ class ZipExtractor:
             if extract_to is None:
                 extract_to = self.base_dir / zip_file.stem
 
-            # 创建解压目录
-            extract_to.mkdir(parents=True, exist_ok=True)
-
-            # 解压文件
-            with zipfile.ZipFile(zip_file, 'r') as zip_ref:
-                # 检查文件数量
-                file_count = len(zip_ref.namelist())
-                logger.info(f"解压 {zip_file.name} (包含 {file_count} 个文件) -> {extract_to.name}")
-
-                # 解压所有文件
-                zip_ref.extractall(extract_to)
+            # 日志确认全部成员都已校验完成后才允许删除原文件
+            if not self._extract_file(zip_file, extract_to):
+                logger.error(f"解压校验未通过，保留原文件: {zip_file.name}")
+                return False
 
-            # 删除原文件
+            # 删除原文件前把解压目录的目录项刷到磁盘，断电后不会只剩下日志而没有文件
             if delete_original:
+                _fsync_tree(extract_to)
                 zip_file.unlink()
                 logger.info(f"已删除原文件: {zip_file.name}")
 
             return True
 
+        except ArchiveLimitError as e:
+            logger.error(f"压缩包超出安全限制，已中止: {zip_file.name}: {str(e)}")
+            return False
         except zipfile.BadZipFile:
             logger.error(f"文件损坏或不是有效的ZIP文件: {zip_file.name}")
             return False
@@ -99,14 +537,30 @@ class ZipExtractor:
         logger.info(f"找到 {len(zip_files)} 个ZIP文件")
 
         results = {"total": len(zip_files), "success": 0, "failed": 0}
+        start_time = time.time()
+        self.bytes_written = 0
+
+        if self.workers > 1 and len(zip_files) > 1:
+            # 多个压缩包并行解压
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                outcomes = executor.map(lambda f: self.extract_zip(f, delete_original=delete_original), zip_files)
+                for success in outcomes:
+                    results["success" if success else "failed"] += 1
+        else:
+            for zip_file in zip_files:
+                if self.extract_zip(zip_file, delete_original=delete_original):
+                    results["success"] += 1
+                else:
+                    results["failed"] += 1
 
-        for zip_file in zip_files:
-            if self.extract_zip(zip_file, delete_original=delete_original):
-                results["success"] += 1
-            else:
-                results["failed"] += 1
+        elapsed = time.time() - start_time
+        results["bytes"] = self.bytes_written
+        results["seconds"] = round(elapsed, 2)
 
         logger.info(f"处理完成: 总共 {results['total']} 个, 成功 {results['success']} 个, 失败 {results['failed']} 个")
+        mb_written = self.bytes_written / 1024 / 1024
+        throughput = mb_written / elapsed if elapsed > 0 else 0
+        logger.info(f"解压数据量: {mb_written:.2f} MB, 用时 {elapsed:.2f} 秒, 吞吐量 {throughput:.2f} MB/s")
         return results
 
 
@@ -119,6 +573,24 @@ def main():
                         help='递归处理子目录中的ZIP文件')
     parser.add_argument('--verbose', '-v', action='store_true',
                         help='详细输出模式')
+    parser.add_argument('--workers', '-w', type=int, default=1,
+                        help='同时解压的压缩包数量（默认 1）')
+    parser.add_argument('--member-workers', type=int, default=1,
+                        help='大压缩包内并行解压成员的线程数（默认 1）')
+    parser.add_argument('--nested', action='store_true',
+                        help='解压过程中继续解压内层ZIP文件')
+    parser.add_argument('--nested-depth', type=int, default=5,
+                        help='内层ZIP文件的最大嵌套层数（默认 5）')
+    parser.add_argument('--max-total-gb', type=float, default=64,
+                        help='单个压缩包解压后总大小上限（GB，默认 64）')
+    parser.add_argument('--max-ratio', type=float, default=200,
+                        help='压缩比上限（默认 200）')
+    parser.add_argument('--max-entries', type=int, default=1_000_000,
+                        help='单个压缩包成员数量上限（默认 1000000）')
+    parser.add_argument('--max-depth', type=int, default=64,
+                        help='成员路径目录层级上限（默认 64）')
+    parser.add_argument('--max-seconds', type=float, default=None,
+                        help='单个压缩包解压耗时上限（秒，默认不限制）')
 
     args = parser.parse_args()
 
@@ -137,7 +609,15 @@ def main():
         return 1
 
     # 创建解压器实例并执行
-    extractor = ZipExtractor(target_dir)
+    limits = ExtractionLimits(
+        max_total_bytes=int(args.max_total_gb * 1024 ** 3),
+        max_ratio=args.max_ratio,
+        max_entries=args.max_entries,
+        max_depth=args.max_depth,
+        max_seconds=args.max_seconds
+    )
+    extractor = ZipExtractor(target_dir, workers=args.workers, member_workers=args.member_workers,
+                             limits=limits, nested=args.nested, nested_depth=args.nested_depth)
     results = extractor.extract_all_zips(
         delete_original=args.delete_original,
         recursive=args.recursive
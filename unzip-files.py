@@ -1,140 +1,755 @@
 import os
+import copy
+import struct
+import tarfile
 import zipfile
 import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from lxml import etree
 from pptx import Presentation
 from pathlib import Path
-import patoolib
 import argparse
 
+try:
+    import rarfile
+except ImportError:
+    rarfile = None
+
+try:
+    import py7zr  # 可选依赖，用于解压 7z
+except ImportError:
+    py7zr = None
+
+# 临时解压目录前缀，遍历时跳过
+TEMP_DIR_PREFIX = '.extracting_'
+
+# 流式解压时每次拷贝的缓冲区大小
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# 解压时遇到同名文件的处理方式：覆盖 / 跳过 / 重命名
+CONFLICT_POLICIES = ('overwrite', 'skip', 'rename')
+
+# 冲突警告中最多列出的文件数
+MAX_CONFLICTS_SHOWN = 20
+
+# 遍历阶段最多领先处理阶段的任务数
+MAX_PENDING_TASKS = 1000
+
+# PPTX 包中用到的命名空间和关系类型
+PML_NS = 'http://schemas.openxmlformats.org/presentationml/2006/main'
+PKG_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+OFFICE_DOCUMENT_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument'
+
+# 原样拷贝压缩数据时的缓冲区大小
+RAW_COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def _copy_raw_member(zin, zout, info):
+    """
+    不解压、不重新压缩，直接把成员的压缩数据拷贝到另一个 ZIP 中
+
+    :param zin: 源 ZipFile（读模式）
+    :param zout: 目标 ZipFile（写模式）
+    :param info: 源成员的 ZipInfo
+    """
+    # 跳过本地文件头，定位到压缩数据
+    zin.fp.seek(info.header_offset)
+    local_header = zin.fp.read(30)
+    name_length, extra_length = struct.unpack('<HH', local_header[26:30])
+    zin.fp.seek(info.header_offset + 30 + name_length + extra_length)
+
+    new_info = copy.copy(info)
+    new_info.extra = b''
+    # 本地文件头中直接写入 CRC 和大小，不再使用数据描述符
+    new_info.flag_bits &= ~0x08
+    new_info.header_offset = zout.fp.tell()
+    zout.fp.write(new_info.FileHeader())
+
+    remaining = info.compress_size
+    while remaining > 0:
+        chunk = zin.fp.read(min(RAW_COPY_BUFFER_SIZE, remaining))
+        if not chunk:
+            raise zipfile.BadZipFile(f"成员数据不完整: {info.filename}")
+        zout.fp.write(chunk)
+        remaining -= len(chunk)
+
+    zout.filelist.append(new_info)
+    zout.NameToInfo[new_info.filename] = new_info
+    zout.start_dir = zout.fp.tell()
+    zout._didModify = True
+
+
+class ArchiveMember:
+    """
+    压缩包中的一个成员
+
+    :param name: 成员在压缩包中的路径
+    :param is_dir: 是否为目录
+    :param opener: 返回成员数据流的函数（流式解压）
+    :param source_path: 已解压到同一文件系统临时目录中的文件（直接重命名）
+    """
+
+    def __init__(self, name, is_dir=False, opener=None, source_path=None):
+        self.name = name
+        self.is_dir = is_dir
+        self.opener = opener
+        self.source_path = source_path
+
+    def extract_to(self, target):
+        """
+        把成员写到目标路径
+
+        :param target: 目标文件路径
+        """
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if self.source_path is not None:
+            os.replace(self.source_path, target)
+            return
+
+        # 先写入同目录的临时文件，完整写完后再替换，中途出错不会留下残缺文件或破坏已有文件
+        temp_path = PPTXProcessor._temp_path(target)
+        try:
+            with self.opener() as src, open(temp_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
+            os.replace(temp_path, target)
+        finally:
+            temp_path.unlink(missing_ok=True)
+
+
+class ArchiveBackend:
+    """
+    压缩格式后端：提供统一的成员列表和流式成员迭代接口
+
+    子类需要设置 extensions，并实现 names() 和 iter_members()
+    """
+
+    extensions = ()
+
+    def __init__(self, archive_path):
+        self.archive_path = archive_path
+
+    @classmethod
+    def available(cls):
+        """依赖的库是否已安装"""
+        return True
+
+    def names(self):
+        """
+        :return: 所有文件成员的路径（不含目录）
+        """
+        raise NotImplementedError
+
+    def iter_members(self):
+        """
+        按压缩包中的顺序逐个产出 ArchiveMember
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ZipBackend(ArchiveBackend):
+    """ZIP 后端（zipfile）"""
+
+    extensions = ('.zip',)
+
+    def __init__(self, archive_path):
+        super().__init__(archive_path)
+        self.archive = zipfile.ZipFile(archive_path, 'r')
+
+    def names(self):
+        return [info.filename for info in self.archive.infolist() if not info.is_dir()]
+
+    def iter_members(self):
+        for info in self.archive.infolist():
+            yield ArchiveMember(info.filename, info.is_dir(), lambda info=info: self.archive.open(info))
+
+    def close(self):
+        self.archive.close()
+
+
+class TempDirBackend(ArchiveBackend):
+    """
+    先整体解压到同目录临时目录、再逐个重命名到目标位置的后端
+
+    用于没有高效逐成员流式接口的格式：整个压缩包只解压一次（只启动一次外部进程），
+    临时目录与目标在同一文件系统中，每个成员只需一次重命名
+    """
+
+    def __init__(self, archive_path):
+        super().__init__(archive_path)
+        self.temp_dir = archive_path.parent / f"{TEMP_DIR_PREFIX}{archive_path.name}"
+
+    def infos(self):
+        """
+        :return: [(成员路径, 是否为目录)]
+        """
+        raise NotImplementedError
+
+    def extract_all(self, path):
+        """把整个压缩包解压到 path"""
+        raise NotImplementedError
+
+    def names(self):
+        return [name for name, is_dir in self.infos() if not is_dir]
+
+    def iter_members(self):
+        infos = self.infos()
+        self.extract_all(self.temp_dir)
+        for name, is_dir in infos:
+            if is_dir:
+                yield ArchiveMember(name, True)
+            else:
+                yield ArchiveMember(name, False, source_path=self.temp_dir / name)
+
+    def close(self):
+        self.archive.close()
+        if self.temp_dir.exists():
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+
+class RarBackend(TempDirBackend):
+    """
+    RAR 后端（rarfile，解压需要 unrar / unar / 7z 等外部工具）
+
+    rarfile 逐成员 open() 时每个成员都会启动一个外部进程，固实压缩包还要从头解压，
+    所以改为 extractall() 一次解压
+    """
+
+    extensions = ('.rar',)
+
+    @classmethod
+    def available(cls):
+        return rarfile is not None
+
+    def __init__(self, archive_path):
+        super().__init__(archive_path)
+        self.archive = rarfile.RarFile(archive_path, 'r')
+
+    def infos(self):
+        return [(info.filename, info.is_dir()) for info in self.archive.infolist()]
+
+    def extract_all(self, path):
+        self.archive.extractall(path=path)
+
+
+class TarBackend(ArchiveBackend):
+    """TAR 后端（tarfile，支持 gz / bz2 / xz 压缩），只解压普通文件和目录"""
+
+    extensions = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+    def __init__(self, archive_path):
+        super().__init__(archive_path)
+        self.archive = tarfile.open(archive_path, 'r:*')
+
+    def names(self):
+        return [member.name for member in self.archive.getmembers() if member.isfile()]
+
+    def iter_members(self):
+        for member in self.archive.getmembers():
+            if member.isdir():
+                yield ArchiveMember(member.name, True)
+            elif member.isfile():
+                yield ArchiveMember(member.name, False, lambda member=member: self.archive.extractfile(member))
+
+    def close(self):
+        self.archive.close()
+
+
+class SevenZipBackend(TempDirBackend):
+    """
+    7z 后端（可选依赖 py7zr）
+
+    py7zr 没有稳定的逐成员流式接口，先在同目录的临时目录中解压，再逐个重命名到目标位置
+    """
+
+    extensions = ('.7z',)
+
+    @classmethod
+    def available(cls):
+        return py7zr is not None
+
+    def __init__(self, archive_path):
+        super().__init__(archive_path)
+        self.archive = py7zr.SevenZipFile(archive_path, 'r')
+
+    def infos(self):
+        return [(info.filename, info.is_directory) for info in self.archive.list()]
+
+    def extract_all(self, path):
+        self.archive.extractall(path=path)
+
+
+# 已注册的压缩格式后端
+ARCHIVE_BACKENDS = (ZipBackend, RarBackend, TarBackend, SevenZipBackend)
+
+# 需要解压的压缩文件扩展名
+ARCHIVE_EXTENSIONS = tuple(ext for backend in ARCHIVE_BACKENDS for ext in backend.extensions)
+
+
+def _backend_for(archive_path):
+    """
+    根据扩展名选择压缩格式后端
+
+    :param archive_path: 压缩文件路径
+    :return: 后端类
+    """
+    name = archive_path.name.lower()
+    for backend in ARCHIVE_BACKENDS:
+        if name.endswith(backend.extensions):
+            if not backend.available():
+                raise RuntimeError(f"缺少 {backend.__name__} 所需的依赖库，无法解压: {archive_path}")
+            return backend
+    raise ValueError(f"不支持的压缩格式: {archive_path}")
+
+
+def _safe_member_path(target_dir, name):
+    """
+    计算成员的输出路径，拒绝绝对路径和包含 .. 的成员
+
+    :param target_dir: 解压目录
+    :param name: 成员路径
+    :return: 输出路径，不安全时返回 None
+    """
+    parts = name.replace('\\', '/').split('/')
+    if name.startswith(('/', '\\')) or (len(name) > 1 and name[1] == ':') or '..' in parts:
+        return None
+    return target_dir.joinpath(*[part for part in parts if part and part != '.'])
+
+
+class DirectoryIndex:
+    """
+    目标目录的文件名索引，多个解压线程共享
+
+    每个目录只用 os.scandir 读取一次，之后按集合查找；解压规划时就预留输出文件名，
+    不需要重新扫描，并发解压的压缩包也能互相看到对方的输出。
+    正在解压的压缩包占有它规划的全部目标路径，解压结束调用 release 之前其他压缩包不会写入这些路径
+    """
+
+    def __init__(self):
+        self._listings = {}
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+        # 正在解压的压缩包占有的目标路径
+        self._owned = set()
+
+    def _listing(self, directory):
+        """返回目录中的文件名集合（调用方需持有锁）"""
+        listing = self._listings.get(directory)
+        if listing is None:
+            try:
+                with os.scandir(directory) as entries:
+                    listing = {entry.name for entry in entries}
+            except OSError:
+                listing = set()
+            self._listings[directory] = listing
+        return listing
+
+    def contains(self, path):
+        """
+        :param path: 文件路径
+        :return: 文件是否已存在
+        """
+        with self._lock:
+            return path.name in self._listing(path.parent)
+
+    def reserve(self, targets, policy):
+        """
+        在锁内一次性检查冲突并预留全部目标文件名，多个压缩包同时规划时不会选中同一个文件名
+
+        其他压缩包正在写入的目标按已存在的文件处理；overwrite 时等它解压结束后再覆盖，
+        同一个文件同一时间只有一个压缩包在写
+
+        :param targets: {成员路径: 目标路径}
+        :param policy: 冲突处理方式: overwrite / skip / rename
+        :return: ({成员路径: 目标路径}（跳过的成员不在其中，其中的路径由调用方占有直到 release）,
+                  冲突的成员路径列表, 新预留的目标路径集合)
+        """
+        plan = {}
+        conflicts = []
+        reserved = set()
+        with self._released:
+            if policy == 'overwrite':
+                # 等待时不占有任何路径，不会互相等待
+                self._released.wait_for(lambda: self._owned.isdisjoint(targets.values()))
+            for name, path in targets.items():
+                listing = self._listing(path.parent)
+                if path.name in listing:
+                    conflicts.append(name)
+                    if policy == 'skip':
+                        continue
+                    if policy == 'rename':
+                        path = self._free_name(path, listing)
+                if path.name not in listing:
+                    listing.add(path.name)
+                    reserved.add(path)
+                plan[name] = path
+                self._owned.add(path)
+        return plan, conflicts, reserved
+
+    def release(self, owned, unused=()):
+        """
+        解压结束后释放对目标路径的占用，并删除预留了但最终没有写入的文件名
+
+        :param owned: reserve 返回的全部目标路径
+        :param unused: 新预留但没有写入的路径
+        """
+        with self._released:
+            self._owned.difference_update(owned)
+            for path in unused:
+                listing = self._listings.get(path.parent)
+                if listing is not None:
+                    listing.discard(path.name)
+            self._released.notify_all()
+
+    @staticmethod
+    def _free_name(path, listing):
+        """生成不冲突的文件名 "名称 (n).扩展名"（调用方需持有锁）"""
+        counter = 1
+        while True:
+            candidate = path.with_name(f"{path.stem} ({counter}){path.suffix}")
+            if candidate.name not in listing:
+                return candidate
+            counter += 1
+
 
 class PPTXProcessor:
     """
     处理PPTX文件和压缩文件的工具类
 
     功能：
-    1. 递归解压目录中的所有ZIP和RAR文件（可选择删除原始压缩文件）
+    1. 递归解压目录中的所有压缩文件（ZIP、RAR、TAR，安装 py7zr 后支持 7z；可选择删除原始压缩文件）
     2. 删除所有PPTX文件的最后一页
     """
 
-    def __init__(self, root_dir, delete_archive=False):
+    def __init__(self, root_dir, delete_archive=False, archive_workers=4, pptx_workers=4,
+                 conflict_policy='overwrite'):
         """
         初始化处理器
 
         :param root_dir: 要处理的根目录
         :param delete_archive: 解压后是否删除原始压缩文件
+        :param archive_workers: 解压阶段的线程数
+        :param pptx_workers: PPTX 处理阶段的线程数
+        :param conflict_policy: 解压遇到同名文件时的处理方式: overwrite / skip / rename
         """
         self.root_dir = Path(root_dir).resolve()
         self.delete_archive = delete_archive
+        self.archive_workers = max(1, archive_workers)
+        self.pptx_workers = max(1, pptx_workers)
+        if conflict_policy not in CONFLICT_POLICIES:
+            raise ValueError(f"不支持的冲突处理方式: {conflict_policy}")
+        self.conflict_policy = conflict_policy
         if not self.root_dir.exists():
             raise FileNotFoundError(f"目录不存在: {self.root_dir}")
 
+        # 解压目标目录的文件名索引
+        self._index = DirectoryIndex()
+
+        # 流水线状态：已认领的文件（保证每个文件只处理一次）和未完成的任务
+        self._lock = threading.Lock()
+        self._claimed = set()
+        self._futures = set()
+
+        # PPTX 任务调度状态：解压覆盖某个 PPTX 时，保证处理发生在写入之后且只处理一次
+        self._pptx_changed = threading.Condition(self._lock)
+        self._pptx_generation = {}  # 路径 -> 最新一次调度的编号，旧编号的任务开始时直接跳过
+        self._pptx_queued = set()   # 已调度、尚未开始的 PPTX
+        self._pptx_running = set()  # 正在处理的 PPTX
+        self._pptx_writers = {}     # 路径 -> 正在写入该路径的压缩包数
+        self._pptx_dirty = set()    # 写入结束后需要重新处理的 PPTX
+        self._slots = threading.BoundedSemaphore(MAX_PENDING_TASKS)
+        self._archive_pool = None
+        self._pptx_pool = None
+
     def process_all(self):
         """
         执行所有处理步骤
+
+        只遍历一次目录：压缩文件交给解压线程池，PPTX 文件交给处理线程池，
+        解压出来的压缩文件和 PPTX 文件解压完成后立即进入对应的线程池
         """
         print(f"开始处理目录: {self.root_dir}")
-        self.extract_all_archives()
-        self.process_all_pptx()
+        with ThreadPoolExecutor(max_workers=self.archive_workers) as archive_pool, \
+                ThreadPoolExecutor(max_workers=self.pptx_workers) as pptx_pool:
+            self._archive_pool = archive_pool
+            self._pptx_pool = pptx_pool
+
+            for file_path in self._scan(self.root_dir):
+                # 限制遍历阶段领先的任务数，避免超大目录一次性堆积任务
+                self._slots.acquire()
+                if not self._submit(file_path, throttled=True):
+                    self._slots.release()
+
+            self._wait_all()
         print("处理完成!")
 
-    def extract_all_archives(self):
+    def _scan(self, directory):
         """
-        递归解压所有ZIP和RAR文件
+        使用 os.scandir 遍历目录，产出压缩文件和 PPTX 文件路径
+
+        :param directory: 遍历的根目录
         """
-        for root, _, files in os.walk(self.root_dir):
-            for file in files:
-                file_path = Path(root) / file
-                if file.lower().endswith('.zip'):
-                    self._extract_zip(file_path)
-                elif file.lower().endswith('.rar'):
-                    self._extract_rar(file_path)
+        stack = [directory]
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not entry.name.startswith(TEMP_DIR_PREFIX):
+                                stack.append(entry.path)
+                        elif entry.name.lower().endswith(ARCHIVE_EXTENSIONS + ('.pptx',)):
+                            yield Path(entry.path)
+            except OSError as e:
+                print(f"读取目录失败 {current}: {str(e)}")
+
+    def _claim(self, file_path):
+        """
+        认领文件，已被认领过的返回 False
 
-    def _extract_zip(self, zip_path):
+        :param file_path: 文件路径
         """
-        解压ZIP文件到当前目录
+        with self._lock:
+            if file_path in self._claimed:
+                return False
+            self._claimed.add(file_path)
+            return True
 
-        :param zip_path: ZIP文件路径
+    def _claim_outputs(self, paths):
         """
-        print(f"解压ZIP文件: {zip_path}")
-        extract_dir = zip_path.parent
+        认领解压产生的压缩文件（需在写入之前调用，避免遍历阶段读到写了一半的文件）
 
-        try:
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                # 先检查是否有同名文件冲突
-                conflict_files = self._check_conflicts(zip_ref, extract_dir)
-                if conflict_files:
-                    print(f"警告: 解压将覆盖以下已存在的文件: {', '.join(conflict_files)}")
+        :param paths: 解压输出的文件路径
+        :return: 本次认领成功、需要继续解压的压缩文件
+        """
+        return {path for path in paths
+                if path.name.lower().endswith(ARCHIVE_EXTENSIONS) and self._claim(path)}
 
-                zip_ref.extractall(extract_dir)
-            print(f"解压完成到: {extract_dir}")
+    def _submit(self, file_path, throttled=False):
+        """
+        认领文件并提交到对应阶段的线程池
 
-            if self.delete_archive:
-                self._safe_delete(zip_path)
+        :param file_path: 压缩文件或PPTX文件路径
+        :param throttled: 是否占用遍历阶段的任务名额
+        :return: 是否提交（已被认领过的文件不再提交）
+        """
+        if file_path.name.lower().endswith(ARCHIVE_EXTENSIONS):
+            if not self._claim(file_path):
+                return False
+            future = self._archive_pool.submit(self._extract_archive_task, file_path)
+        else:
+            # 认领和调度在同一把锁内完成，解压线程看到的认领状态和调度状态总是一致
+            with self._lock:
+                if file_path in self._claimed:
+                    return False
+                self._claimed.add(file_path)
+                generation = self._schedule_pptx(file_path)
+            future = self._pptx_pool.submit(self._pptx_task, file_path, generation)
+
+        with self._lock:
+            self._futures.add(future)
+        if throttled:
+            future.add_done_callback(lambda _: self._slots.release())
+        return True
+
+    def _submit_archive(self, archive_path):
+        """提交解压产生的、已认领的压缩文件"""
+        future = self._archive_pool.submit(self._extract_archive_task, archive_path)
+        with self._lock:
+            self._futures.add(future)
+
+    def _schedule_pptx(self, pptx_path):
+        """
+        为 PPTX 分配新的调度编号（调用方需持有锁）
 
-        except Exception as e:
-            print(f"解压ZIP文件失败 {zip_path}: {str(e)}")
+        :return: 调度编号
+        """
+        generation = self._pptx_generation.get(pptx_path, 0) + 1
+        self._pptx_generation[pptx_path] = generation
+        self._pptx_queued.add(pptx_path)
+        return generation
 
-    def _extract_rar(self, rar_path):
+    def _pptx_task(self, pptx_path, generation):
         """
-        解压RAR文件到当前目录
+        PPTX 处理阶段的任务：已有更新的调度或正在被解压覆盖时跳过
 
-        :param rar_path: RAR文件路径
+        :param pptx_path: PPTX文件路径
+        :param generation: 调度编号
         """
-        print(f"解压RAR文件: {rar_path}")
-        extract_dir = rar_path.parent
+        with self._lock:
+            if generation != self._pptx_generation.get(pptx_path):
+                return
+            self._pptx_queued.discard(pptx_path)
+            if pptx_path in self._pptx_writers:
+                # 写入结束后重新调度
+                self._pptx_dirty.add(pptx_path)
+                return
+            self._pptx_running.add(pptx_path)
 
         try:
-            # patoolib没有提供直接检查冲突的方法，所以先解压再处理
-            temp_dir = extract_dir / f"temp_{rar_path.stem}"
-            patoolib.extract_archive(str(rar_path), outdir=str(temp_dir))
+            self._remove_last_slide(pptx_path)
+        finally:
+            with self._pptx_changed:
+                self._pptx_running.discard(pptx_path)
+                self._pptx_changed.notify_all()
+
+    def _begin_pptx_writes(self, pptx_paths):
+        """
+        解压写入 PPTX 之前调用：取消尚未开始的处理任务，并等待正在进行的处理完成
 
-            # 移动文件并处理冲突
-            self._move_contents(temp_dir, extract_dir)
+        :param pptx_paths: 即将写入的 PPTX 路径
+        """
+        with self._pptx_changed:
+            for path in pptx_paths:
+                self._claimed.add(path)
+                self._pptx_writers[path] = self._pptx_writers.get(path, 0) + 1
+                if path in self._pptx_queued:
+                    # 让排队中的旧任务失效，写入结束后统一重新调度
+                    self._pptx_queued.discard(path)
+                    self._pptx_generation[path] += 1
+                    self._pptx_dirty.add(path)
+            while any(path in self._pptx_running for path in pptx_paths):
+                self._pptx_changed.wait()
+
+    def _end_pptx_writes(self, pptx_paths, written):
+        """
+        解压写入 PPTX 之后调用：最后一个写入者结束时，为写入过或被推迟的 PPTX 调度一次处理
 
-            # 删除临时目录
-            shutil.rmtree(temp_dir)
+        :param pptx_paths: _begin_pptx_writes 登记过的路径
+        :param written: 实际写入成功的路径
+        """
+        scheduled = []
+        with self._lock:
+            for path in pptx_paths:
+                if path in written:
+                    self._pptx_dirty.add(path)
+                self._pptx_writers[path] -= 1
+                if self._pptx_writers[path]:
+                    continue
+                del self._pptx_writers[path]
+                if path in self._pptx_dirty and self._pptx_pool is not None:
+                    self._pptx_dirty.discard(path)
+                    scheduled.append((path, self._schedule_pptx(path)))
+
+        for path, generation in scheduled:
+            future = self._pptx_pool.submit(self._pptx_task, path, generation)
+            with self._lock:
+                self._futures.add(future)
+
+    def _extract_archive_task(self, archive_path):
+        """
+        解压阶段的任务：解压后把新产生的压缩文件送入解压阶段（PPTX 在写入结束时已调度）
+
+        :param archive_path: 压缩文件路径
+        """
+        for output_path in self._extract_archive(archive_path):
+            self._submit_archive(output_path)
+
+    def _wait_all(self):
+        """等待所有任务（包括解压过程中新提交的任务）完成"""
+        while True:
+            with self._lock:
+                futures = list(self._futures)
+            if not futures:
+                return
+
+            done, _ = wait(futures)
+            with self._lock:
+                self._futures.difference_update(done)
+            for future in done:
+                if future.exception():
+                    print(f"处理任务失败: {future.exception()}")
+
+    def extract_all_archives(self):
+        """
+        递归解压所有压缩文件（单独执行解压步骤时使用）
+        """
+        for root, _, files in os.walk(self.root_dir):
+            for file in files:
+                if file.lower().endswith(ARCHIVE_EXTENSIONS):
+                    self._extract_archive(Path(root) / file)
+
+    def _extract_archive(self, archive_path):
+        """
+        解压压缩文件到当前目录，按扩展名选择后端逐个成员流式写出
+
+        :param archive_path: 压缩文件路径
+        :return: 解压出的、需要继续解压的压缩文件
+        """
+        print(f"解压压缩文件: {archive_path}")
+        extract_dir = archive_path.parent
+        archives = set()
+        pptx_paths = []
+        plan = {}
+        reserved = set()
+        written = set()
+
+        try:
+            with _backend_for(archive_path)(archive_path) as backend:
+                # 按冲突处理方式一次性算出每个成员的输出路径
+                plan, reserved = self._plan_targets(backend.names(), extract_dir)
+                archives = self._claim_outputs(plan.values())
+                pptx_paths = [path for path in plan.values() if path.name.lower().endswith('.pptx')]
+                self._begin_pptx_writes(pptx_paths)
+
+                for member in backend.iter_members():
+                    if member.is_dir:
+                        target = _safe_member_path(extract_dir, member.name)
+                        if target is not None:
+                            target.mkdir(parents=True, exist_ok=True)
+                        continue
+
+                    target = plan.get(member.name)
+                    if target is None:
+                        continue
+                    member.extract_to(target)
+                    written.add(target)
             print(f"解压完成到: {extract_dir}")
 
             if self.delete_archive:
-                self._safe_delete(rar_path)
+                self._safe_delete(archive_path)
 
         except Exception as e:
-            print(f"解压RAR文件失败 {rar_path}: {str(e)}")
-            if temp_dir.exists():
-                shutil.rmtree(temp_dir, ignore_errors=True)
+            print(f"解压文件失败 {archive_path}: {str(e)}")
+        finally:
+            self._index.release(plan.values(), reserved - written)
+            self._end_pptx_writes(pptx_paths, written)
+        # 只返回实际写入成功的压缩文件
+        return [path for path in archives if path in written]
 
-    def _check_conflicts(self, zip_ref, target_dir):
+    def _plan_targets(self, names, target_dir):
         """
-        检查解压是否会覆盖现有文件
-        :param zip_ref: ZipFile对象
+        计算每个文件成员的输出路径，按冲突处理方式处理已存在的文件，并在目录索引中预留所有输出路径
+
+        :param names: 文件成员路径列表
         :param target_dir: 目标目录
-        :return: 冲突文件列表
-        """
-        conflict_files = []
-        for file in zip_ref.namelist():
-            if not file.endswith('/'):  # 忽略目录
-                dest_path = Path(target_dir) / file
-                if dest_path.exists():
-                    conflict_files.append(file)
-        return conflict_files
-
-    def _move_contents(self, src_dir, dest_dir):
-        """
-        移动源目录所有内容到目标目录，处理冲突
-        :param src_dir: 源目录
-        :param dest_dir: 目标目录
-        """
-        for item in src_dir.iterdir():
-            dest_item = dest_dir / item.name
-            if dest_item.exists():
-                if dest_item.is_dir():
-                    # 如果是目录，递归合并
-                    self._move_contents(item, dest_item)
-                else:
-                    # 如果是文件，覆盖
-                    shutil.move(str(item), str(dest_item))
-            else:
-                shutil.move(str(item), str(dest_dir))
+        :return: ({成员路径: 输出路径}（跳过的成员不在其中）, 新预留的输出路径集合)
+        """
+        targets = {}
+        for name in names:
+            target = _safe_member_path(Path(target_dir), name)
+            if target is None:
+                print(f"警告: 跳过不安全的成员路径: {name}")
+                continue
+            targets[name] = target
+
+        plan, conflict_names, reserved = self._index.reserve(targets, self.conflict_policy)
+        if conflict_names:
+            shown = ', '.join(conflict_names[:MAX_CONFLICTS_SHOWN])
+            if len(conflict_names) > MAX_CONFLICTS_SHOWN:
+                shown += f" 等 {len(conflict_names)} 个文件"
+            actions = {'overwrite': '覆盖', 'skip': '跳过', 'rename': '重命名'}
+            print(f"警告: 以下文件已存在，将{actions[self.conflict_policy]}: {shown}")
+        return plan, reserved
 
     def _safe_delete(self, file_path):
         """
@@ -149,7 +764,7 @@ class PPTXProcessor:
 
     def process_all_pptx(self):
         """
-        递归处理所有PPTX文件，删除最后一页
+        递归处理所有PPTX文件，删除最后一页（单独执行处理步骤时使用）
         """
         for root, _, files in os.walk(self.root_dir):
             for file in files:
@@ -161,16 +776,95 @@ class PPTXProcessor:
         """
         删除PPTX文件的最后一页
 
+        优先直接在 ZIP 层面修改 presentation.xml，失败时改用 python-pptx 完整加载处理
+
         :param pptx_path: PPTX文件路径
         """
         print(f"处理PPTX文件: {pptx_path}")
-        backup_path = None
+        try:
+            if self._remove_last_slide_fast(pptx_path):
+                print(f"已删除最后一页并保存: {pptx_path}")
+            return
+        except Exception as e:
+            print(f"快速处理失败，改用 python-pptx 处理 {pptx_path}: {str(e)}")
+
+        self._remove_last_slide_pptx(pptx_path)
+
+    @staticmethod
+    def _presentation_part(zin):
+        """
+        从包关系 _rels/.rels 中找到主文档部件（通常为 ppt/presentation.xml）
+
+        :param zin: PPTX 的 ZipFile 对象
+        """
+        rels = etree.fromstring(zin.read('_rels/.rels'))
+        for rel in rels.iter(f'{{{PKG_REL_NS}}}Relationship'):
+            if rel.get('Type') == OFFICE_DOCUMENT_REL:
+                return rel.get('Target').lstrip('/')
+        raise ValueError("找不到主文档部件")
 
+    def _remove_last_slide_fast(self, pptx_path):
+        """
+        在 ZIP 层面删除最后一页：只改写 presentation.xml 中的 sldIdLst，
+        其余部件（包括关系部件和媒体文件）原样拷贝压缩数据，不重新压缩
+
+        与 python-pptx 的处理方式一致，幻灯片部件和关系保留在包中，只是不再出现在放映列表里
+
+        :param pptx_path: PPTX文件路径
+        :return: 是否修改了文件（没有幻灯片时返回 False）
+        """
+        temp_path = self._temp_path(pptx_path)
         try:
-            # 创建备份文件
-            backup_path = pptx_path.with_suffix('.pptx.bak')
-            shutil.copy2(pptx_path, backup_path)
+            with zipfile.ZipFile(pptx_path, 'r') as zin:
+                part_name = self._presentation_part(zin)
+                root = etree.fromstring(zin.read(part_name))
+                sld_id_lst = root.find(f'{{{PML_NS}}}sldIdLst')
+                slides = list(sld_id_lst) if sld_id_lst is not None else []
+                if not slides:
+                    print(f"警告: {pptx_path} 中没有幻灯片")
+                    return False
+
+                sld_id_lst.remove(slides[-1])
+                presentation_xml = etree.tostring(root, xml_declaration=True, encoding='UTF-8', standalone=True)
+
+                with zipfile.ZipFile(temp_path, 'w') as zout:
+                    for info in zin.infolist():
+                        if info.filename == part_name:
+                            new_info = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+                            new_info.external_attr = info.external_attr
+                            new_info.compress_type = zipfile.ZIP_DEFLATED
+                            zout.writestr(new_info, presentation_xml)
+                        else:
+                            _copy_raw_member(zin, zout, info)
+
+            # 写入完成后整体替换原文件
+            shutil.copymode(pptx_path, temp_path)
+            os.replace(temp_path, pptx_path)
+            return True
+        finally:
+            temp_path.unlink(missing_ok=True)
 
+    @staticmethod
+    def _temp_path(file_path):
+        """
+        与目标文件同目录的临时文件路径，保证最后的 os.replace 是同一文件系统内的原子重命名；
+        路径中带进程和线程号，并发写入同一目标时各自写完整的文件
+
+        :param file_path: 目标文件路径
+        """
+        return file_path.with_name(f".{file_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+    def _remove_last_slide_pptx(self, pptx_path):
+        """
+        使用 python-pptx 完整加载演示文稿并删除最后一页
+
+        先保存到临时文件，成功后原子替换原文件；失败时原文件保持不变，不需要备份
+
+        :param pptx_path: PPTX文件路径
+        """
+        temp_path = self._temp_path(pptx_path)
+
+        try:
             # 加载演示文稿
             prs = Presentation(pptx_path)
 
@@ -184,22 +878,17 @@ class PPTXProcessor:
             last_slide = slides[-1]
             xml_slides.remove(last_slide)
 
-            # 保存修改后的文件
-            prs.save(pptx_path)
+            # 保存到临时文件后替换原文件
+            prs.save(temp_path)
+            shutil.copymode(pptx_path, temp_path)
+            os.replace(temp_path, pptx_path)
             print(f"已删除最后一页并保存: {pptx_path}")
 
         except Exception as e:
             print(f"处理PPTX文件失败 {pptx_path}: {str(e)}")
-            # 如果出错，恢复备份
-            if backup_path and backup_path.exists():
-                shutil.move(backup_path, pptx_path)
         finally:
-            # 如果处理成功，删除备份
-            if backup_path and backup_path.exists():
-                try:
-                    backup_path.unlink()
-                except:
-                    pass
+            # 出错时清理临时文件
+            temp_path.unlink(missing_ok=True)
 
 
 if __name__ == "__main__":
@@ -207,9 +896,17 @@ if __name__ == "__main__":
     parser.add_argument("directory", help="要处理的目录路径")
     parser.add_argument("--delete", action="store_true",
                         help="解压后删除原始压缩文件")
+    parser.add_argument("--on-conflict", choices=CONFLICT_POLICIES, default='overwrite',
+                        help="解压遇到同名文件时: overwrite 覆盖 / skip 跳过 / rename 重命名（默认 overwrite）")
+    parser.add_argument("--archive-workers", type=int, default=4,
+                        help="解压阶段的线程数（默认 4）")
+    parser.add_argument("--pptx-workers", type=int, default=4,
+                        help="PPTX 处理阶段的线程数（默认 4）")
     args = parser.parse_args()
 
-    processor = PPTXProcessor(args.directory, args.delete)
+    processor = PPTXProcessor(args.directory, args.delete,
+                              archive_workers=args.archive_workers, pptx_workers=args.pptx_workers,
+                              conflict_policy=args.on_conflict)
     processor.process_all()
 
 